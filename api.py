@@ -0,0 +1,405 @@
+"""JSON API for mobile and partner clients, served over ASGI next to the Flask site.
+
+    uvicorn api:api --port 8000
+
+Reads (search, seat map, booking lookup) run on an async engine, so a worker
+can keep thousands of slow connections open while it waits on the database.
+Writes (holds and bookings) reuse the Flask app's transactional helpers --
+seat reservation, hold expiry, PNR allocation -- on a thread pool, so both
+front ends share one implementation of the booking rules.
+
+Clients authenticate with the Flask session cookie (log in through /login
+first); the API and the site must run with the same FLASK_SECRET_KEY.
+"""
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import wraps
+
+from itsdangerous import BadSignature
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app import (app as flask_app, db, Flight, Booking, Passenger, SeatHold, SEAT_ROWS, SEATS_PER_ROW,
+                 airport_code, flight_search_criteria, flight_snapshot, search_cache, occupied_seats,
+                 engine_options, route_graph, fare_calendar_query, fare_calendar_days, fare_calendar_window,
+                 seat_holds_due, expire_seat_holds, place_seat_hold, release_seat_hold, create_booking,
+                 schedule_ticket_render, booking_history_criteria, booking_history_cursor,
+                 booking_history_date)
+
+# Sync dialect -> asyncio driver for the same database
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+def async_database_uri(uri):
+    scheme, rest = uri.split('://', 1)
+    dialect = scheme.split('+', 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {dialect}")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+def make_async_engine(uri):
+    engine = create_async_engine(async_database_uri(uri), **engine_options(uri))
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine.sync_engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            # Same settings as the Flask engine (see app.set_sqlite_pragmas)
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute(f"PRAGMA busy_timeout={flask_app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+    return engine
+
+engine = make_async_engine(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+# Search and seat maps may come from the replica; a user's own booking is always read from the primary
+replica_bind = flask_app.config.get('SQLALCHEMY_BINDS', {}).get('replica')
+read_engine = make_async_engine(replica_bind['url']) if replica_bind else engine
+
+session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+FLIGHT_COLUMNS = (Flight.id, Flight.flight_number, Flight.airline, Flight.departure, Flight.destination,
+                  Flight.departure_time, Flight.arrival_time, Flight.price, Flight.available_seats)
+
+def error(message, status=400):
+    return JSONResponse({'success': False, 'error': message}, status_code=status)
+
+def flight_json(snapshot):
+    return dict(snapshot,
+                departure_time=snapshot['departure_time'].isoformat(),
+                arrival_time=snapshot['arrival_time'].isoformat())
+
+def session_user_id(request):
+    # Flask's signed session cookie; expired or tampered cookies count as logged out
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    try:
+        data = session_serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get('user_id')
+
+def login_required(f):
+    @wraps(f)
+    async def decorated_function(request):
+        user_id = session_user_id(request)
+        if user_id is None:
+            return error('Login required', 401)
+        request.state.user_id = user_id
+        return await f(request)
+    return decorated_function
+
+def in_app_context(f, *args):
+    with flask_app.app_context():
+        if seat_holds_due():
+            try:
+                expire_seat_holds()
+            except SQLAlchemyError as e:
+                print(f"[ERROR] expire_seat_holds: {e}")
+        return f(*args)
+
+async def run_write(f, *args):
+    # Writes are short transactions on the Flask engine, run off the event loop
+    return await run_in_threadpool(in_app_context, f, *args)
+
+def hold_seats(user_id, flight_id, seats):
+    hold = place_seat_hold(user_id, flight_id, seats)
+    if not hold:
+        return None
+    return {'hold_id': hold.id, 'flight_id': flight_id, 'seats': seats, 'fare': hold.fare,
+            'expires_at': hold.expires_at.isoformat()}
+
+def release_own_hold(user_id, hold_id):
+    hold = db.session.get(SeatHold, hold_id)
+    if not hold or hold.user_id != user_id:
+        return False
+    return release_seat_hold(hold_id)
+
+def book_seats(user_id, booking_data):
+    booking = create_booking(user_id, booking_data)
+    if not booking:
+        return None
+    schedule_ticket_render(booking)
+    return booking.pnr
+
+def parse_passengers(items):
+    # Same rules as the passenger details form
+    if not isinstance(items, list) or not items:
+        raise ValueError('At least one passenger is required')
+    passengers = []
+    for i, item in enumerate(items, 1):
+        item = item if isinstance(item, dict) else {}
+        first_name = str(item.get('first_name') or '').strip()
+        last_name = str(item.get('last_name') or '').strip()
+        gender = str(item.get('gender') or '').strip()
+        passport = str(item.get('passport') or '').strip()
+        age = item.get('age')
+        if not first_name or not last_name or not gender or not isinstance(age, int) or age <= 0:
+            raise ValueError(f'Fill all details for passenger {i}')
+        passengers.append({
+            'first_name': first_name,
+            'last_name': last_name,
+            'age': age,
+            'gender': gender,
+            'passport': passport or None
+        })
+    return passengers
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ValueError('Request body must be JSON')
+    if not isinstance(body, dict):
+        raise ValueError('Request body must be a JSON object')
+    return body
+
+@login_required
+async def search_flights(request):
+    params = request.query_params
+    departure = airport_code(params.get('departure'))
+    destination = airport_code(params.get('destination'))
+    try:
+        travel_date = datetime.strptime(params.get('date', ''), '%Y-%m-%d').date()
+        passengers = int(params.get('passengers', 1))
+    except ValueError:
+        return error('Invalid date or passenger count')
+    if not departure or not destination:
+        return error('departure and destination are required')
+    if departure == destination:
+        return error('Departure and destination cannot be same')
+    if travel_date < datetime.now().date():
+        return error('Please select today or a future date')
+    if passengers <= 0:
+        return error('passengers must be positive')
+
+    # Same cache code as the HTML search, but uvicorn and gunicorn are separate processes with a cache each:
+    # bookings made here evict this process's entries only, other front ends catch up within SEARCH_CACHE_TTL
+    started = time.perf_counter()
+    cache_key = (departure, destination, travel_date, passengers)
+    flights = search_cache.get(cache_key)
+    if flights is None:
+        generation = search_cache.generation(cache_key)
+        async with engine.connect() as conn:  # Primary, as in the HTML search: the result is cached
+            rows = await conn.execute(
+                select(*FLIGHT_COLUMNS)
+                .where(*flight_search_criteria(departure, destination, travel_date, passengers))
+                .order_by(Flight.departure_time)
+            )
+            flights = [flight_snapshot(row) for row in rows]
+        search_cache.set(cache_key, flights, generation)
+        search_cache.record(False, time.perf_counter() - started)
+    else:
+        search_cache.record(True, time.perf_counter() - started)
+
+    return JSONResponse({'success': True, 'flights': [flight_json(flight) for flight in flights]})
+
+@login_required
+async def fare_calendar(request):
+    params = request.query_params
+    departure = airport_code(params.get('departure'))
+    destination = airport_code(params.get('destination'))
+    try:
+        travel_date = datetime.strptime(params.get('date', ''), '%Y-%m-%d').date()
+        days = int(params.get('days', 3))
+        passengers = int(params.get('passengers', 1))
+    except ValueError:
+        return error('Invalid date or number')
+    if not departure or not destination or departure == destination:
+        return error('Choose two different airports')
+
+    start_date, end_date = fare_calendar_window(travel_date, days)
+    async with read_engine.connect() as conn:
+        rows = (await conn.execute(
+            fare_calendar_query(departure, destination, start_date, end_date, passengers))).all()
+    return JSONResponse({'success': True, 'departure': departure, 'destination': destination,
+                         'days': fare_calendar_days(rows, start_date, end_date)})
+
+def find_connections(*args):
+    with flask_app.app_context():
+        return route_graph.itineraries(*args)
+
+@login_required
+async def search_connections(request):
+    params = request.query_params
+    departure = airport_code(params.get('departure'))
+    destination = airport_code(params.get('destination'))
+    try:
+        travel_date = datetime.strptime(params.get('date', ''), '%Y-%m-%d').date()
+        passengers = int(params.get('passengers', 1))
+    except ValueError:
+        return error('Invalid date or passenger count')
+    if not departure or not destination or departure == destination:
+        return error('Choose two different airports')
+    if passengers <= 0:
+        return error('passengers must be positive')
+
+    # The route graph is in memory; only a day that isn't loaded yet touches the database
+    itineraries = await run_in_threadpool(find_connections, departure, destination, travel_date, passengers)
+    return JSONResponse({'success': True, 'itineraries': [{
+        'stops': len(legs) - 1,
+        'price': round(sum(leg['price'] for leg in legs), 2),
+        'departure_time': legs[0]['departure_time'].isoformat(),
+        'arrival_time': legs[-1]['arrival_time'].isoformat(),
+        'legs': [flight_json(leg) for leg in legs]
+    } for legs in itineraries]})
+
+@login_required
+async def seat_map(request):
+    flight_id = request.path_params['flight_id']
+    async with read_engine.connect() as conn:
+        flight = (await conn.execute(
+            select(Flight.seat_map, Flight.available_seats, Flight.total_seats).where(Flight.id == flight_id)
+        )).one_or_none()
+    if not flight:
+        return error('Flight not found', 404)
+    return JSONResponse({
+        'success': True,
+        'flight_id': flight_id,
+        'rows': list(SEAT_ROWS),
+        'seats_per_row': SEATS_PER_ROW,
+        'occupied': occupied_seats(flight.seat_map),
+        'available_seats': flight.available_seats,
+        'total_seats': flight.total_seats
+    })
+
+@login_required
+async def create_hold(request):
+    try:
+        body = await read_json(request)
+        flight_id, seats = int(body['flight_id']), int(body['seats'])
+    except (KeyError, TypeError, ValueError):
+        return error('flight_id and seats are required')
+    if seats <= 0:
+        return error('seats must be positive')
+
+    hold = await run_write(hold_seats, request.state.user_id, flight_id, seats)
+    if not hold:
+        return error('Not enough seats available', 409)
+    return JSONResponse(dict(hold, success=True), status_code=201)
+
+@login_required
+async def delete_hold(request):
+    released = await run_write(release_own_hold, request.state.user_id, request.path_params['hold_id'])
+    if not released:
+        return error('Hold not found or no longer active', 404)
+    return JSONResponse({'success': True})
+
+@login_required
+async def create_booking_endpoint(request):
+    try:
+        body = await read_json(request)
+        flight_id = int(body['flight_id'])
+        hold_id = int(body['hold_id']) if body.get('hold_id') is not None else None
+        passengers = parse_passengers(body.get('passengers'))
+    except (KeyError, TypeError, ValueError) as e:
+        return error(str(e) if isinstance(e, ValueError) else 'flight_id and passengers are required')
+
+    async with engine.connect() as conn:
+        if (await conn.execute(select(Flight.id).where(Flight.id == flight_id))).first() is None:
+            return error('Flight not found', 404)
+
+    pnr = await run_write(book_seats, request.state.user_id, {
+        'flight_id': flight_id,
+        'num_passengers': len(passengers),
+        'passengers': passengers,
+        'hold_id': hold_id
+    })
+    if not pnr:
+        return error('Not enough seats available', 409)
+    return JSONResponse({'success': True, 'pnr': pnr}, status_code=201)
+
+@login_required
+async def get_booking(request):
+    async with engine.connect() as conn:
+        booking = (await conn.execute(
+            select(Booking.id.label('booking_id'), Booking.pnr, Booking.status, Booking.booking_date,
+                   Booking.passenger_count, Booking.fare, *FLIGHT_COLUMNS)
+            .join(Flight, Booking.flight_id == Flight.id)
+            .where(Booking.pnr == request.path_params['pnr'], Booking.user_id == request.state.user_id)
+        )).one_or_none()
+        if not booking:
+            return error('Booking not found', 404)
+        passengers = (await conn.execute(
+            select(Passenger.first_name, Passenger.last_name, Passenger.age, Passenger.gender,
+                   Passenger.seat_number)
+            .where(Passenger.booking_id == booking.booking_id)
+            .order_by(Passenger.id)
+        )).mappings().all()
+
+    flight = flight_json({column.key: getattr(booking, column.key) for column in FLIGHT_COLUMNS})
+    return JSONResponse({
+        'success': True,
+        'pnr': booking.pnr,
+        'status': booking.status,
+        'booking_date': booking.booking_date.isoformat() if booking.booking_date else None,
+        'passenger_count': booking.passenger_count,
+        'total_price': (booking.fare if booking.fare is not None else flight['price']) * booking.passenger_count,
+        'flight': flight,
+        'passengers': [dict(passenger) for passenger in passengers]
+    })
+
+@login_required
+async def list_bookings(request):
+    # Newest first, BOOKING_HISTORY_PAGE_SIZE at a time; pass next_cursor back as ?cursor= for the next page
+    page_size = flask_app.config['BOOKING_HISTORY_PAGE_SIZE']
+    try:
+        criteria = booking_history_criteria(request.state.user_id, request.query_params.get('cursor'))
+    except ValueError:
+        return error('Invalid cursor')
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(
+            select(Booking.id.label('booking_id'), Booking.pnr, Booking.status, Booking.booking_date,
+                   Booking.passenger_count, Booking.fare, *FLIGHT_COLUMNS)
+            .join(Flight, Booking.flight_id == Flight.id)
+            .where(*criteria)
+            .order_by(booking_history_date.desc(), Booking.id.desc())
+            .limit(page_size + 1)
+        )).all()
+
+    bookings = []
+    for booking in rows[:page_size]:
+        flight = flight_json({column.key: getattr(booking, column.key) for column in FLIGHT_COLUMNS})
+        bookings.append({
+            'pnr': booking.pnr,
+            'status': booking.status,
+            'booking_date': booking.booking_date.isoformat() if booking.booking_date else None,
+            'passenger_count': booking.passenger_count,
+            'total_price': (booking.fare if booking.fare is not None else flight['price']) * booking.passenger_count,
+            'flight': flight
+        })
+    last = rows[page_size - 1] if len(rows) > page_size else None
+    return JSONResponse({
+        'success': True,
+        'bookings': bookings,
+        'next_cursor': booking_history_cursor(last.booking_date, last.booking_id) if last else None
+    })
+
+@asynccontextmanager
+async def lifespan(api):
+    yield
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+api = Starlette(routes=[
+    Route('/api/flights', search_flights),
+    Route('/api/flights/{flight_id:int}/seats', seat_map),
+    Route('/api/connections', search_connections),
+    Route('/api/fare-calendar', fare_calendar),
+    Route('/api/holds', create_hold, methods=['POST']),
+    Route('/api/holds/{hold_id:int}', delete_hold, methods=['DELETE']),
+    Route('/api/bookings', create_booking_endpoint, methods=['POST']),
+    Route('/api/bookings', list_bookings),
+    Route('/api/bookings/{pnr}', get_booking)
+], lifespan=lifespan)
@@ -1,15 +1,37 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from datetime import datetime, timedelta
 from flask import jsonify
 import random
 import os
+import sqlite3
+import json
 import string
+import secrets
+import time
+import heapq
+import bisect
+import threading
+import csv
+import io
+import itertools
 import logging
-from functools import wraps
-from sqlalchemy.exc import SQLAlchemyError
+import hashlib
+import click
+import zipfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import wraps, lru_cache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, IntegrityError
 from flask import send_file  # Make sure this is added at the top
+from flask import Response, stream_with_context, g, has_app_context, make_response
+from rendering import render_ticket_pdf, render_stats, preload as preload_renderers
 
 
 app = Flask(__name__)
@@ -18,16 +40,129 @@ app.config['WTF_CSRF_SECRET_KEY'] = os.urandom(24)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', os.urandom(24))
 
 # Enable secure session cookies (only over HTTPS)
-app.config['SESSION_COOKIE_SECURE'] = True  # Ensure this only works over HTTPS in production
+app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', '1') == '1'  # Ensure this only works over HTTPS in production
 
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)  # Session expires after 2 hours
+# One algorithm for new passwords; older hashes are upgraded to it on the next successful login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# Hashes run on a small pool so a login burst can't take every CPU; beyond the queue, logins are shed
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+app.config['PASSWORD_HASH_WAIT'] = 2.0  # seconds a login waits for a place in the queue
+# Login attempts allowed per username and per client IP (token buckets, per worker): burst, then per second
+app.config['LOGIN_USERNAME_BURST'] = int(os.environ.get('LOGIN_USERNAME_BURST', 5))
+app.config['LOGIN_USERNAME_RATE'] = 1 / 60
+app.config['LOGIN_IP_BURST'] = int(os.environ.get('LOGIN_IP_BURST', 20))
+app.config['LOGIN_IP_RATE'] = 0.5
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///airline.db'
+def database_uri():
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///airline.db')
+    # Hosting platforms still hand out the pre-SQLAlchemy-1.4 scheme
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def engine_options(uri):
+    # Pool settings per worker process; total connections = workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    in_memory = uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///') or ':memory:' in uri)
+    if not in_memory:
+        options.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30))
+        )
+    return options
+
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# Optional read replica for read-only routes (see RoutingSession)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    replica_uri = os.environ['DATABASE_REPLICA_URL']
+    app.config['SQLALCHEMY_BINDS'] = {'replica': dict(engine_options(replica_uri), url=replica_uri)}
+# After a user writes, their reads stay on the primary this long so they see their own changes
+app.config['REPLICA_READ_YOUR_WRITES_SECONDS'] = int(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10))
+# Applied to every new SQLite connection (see set_sqlite_pragmas)
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# Retries for SQLite "database is locked" errors (exponential backoff with jitter)
+app.config['DB_LOCK_RETRIES'] = 5
+app.config['DB_LOCK_BACKOFF'] = 0.05  # seconds, doubled on every attempt
+# Lost seat map compare-and-sets before the unit of work is retried in a fresh transaction
+app.config['SEAT_CLAIM_ATTEMPTS'] = 5
+# How long seats stay held between passenger details and payment
+app.config['SEAT_HOLD_TTL'] = timedelta(minutes=15)
+# Where in-progress bookings live; the cookie only carries the draft id.
+# 'memory' is an in-process LRU (single worker only), 'database' a table shared by all workers
+app.config['DRAFT_STORE'] = os.environ.get('DRAFT_STORE', 'database')
+app.config['DRAFT_TTL'] = app.config['SEAT_HOLD_TTL']
+app.config['DRAFT_CACHE_SIZE'] = 10000
+# Timetable generated ahead of time by extend_schedule (never from inside a search)
+app.config['SCHEDULE_SEED'] = int(os.environ.get('SCHEDULE_SEED', 0))
+app.config['SCHEDULE_FLIGHTS_PER_DAY'] = 2  # per route
+app.config['SAMPLE_SCHEDULE_DAYS'] = 30
+# Flight search results per (departure, destination, date, passengers); evicted per route/date on seat changes
+app.config['SEARCH_CACHE_SIZE'] = 5000
+app.config['SEARCH_CACHE_TTL'] = 60  # seconds; bounds staleness from other workers' bookings
+# Connection search over the in-memory route graph (see RouteGraph)
+app.config['CONNECTION_MAX_STOPS'] = 2
+app.config['CONNECTION_MIN_TIME'] = timedelta(minutes=45)  # between arrival and the next departure
+app.config['CONNECTION_MAX_DURATION'] = timedelta(hours=24)  # first departure to final arrival
+app.config['ROUTE_GRAPH_DAYS'] = 60  # days of legs kept in memory, least recently searched dropped first
+app.config['ROUTE_GRAPH_TTL'] = 300  # seconds before a day is re-read; bounds staleness from other workers
+# Widest fare calendar window, in days either side of the chosen date
+app.config['FARE_CALENDAR_MAX_DAYS'] = 30
+app.config['BOOKING_HISTORY_PAGE_SIZE'] = 20  # bookings per page of /my-bookings and GET /api/bookings
+# Fare = base_price * load factor multiplier * days-to-departure multiplier, piecewise linear
+# between these (x, multiplier) points; applied by `flask reprice` (see reprice_flights)
+app.config['PRICING_LOAD_CURVE'] = [(0.0, 0.85), (0.5, 1.0), (0.8, 1.3), (1.0, 1.8)]
+app.config['PRICING_DAYS_CURVE'] = [(0, 1.5), (3, 1.35), (7, 1.2), (14, 1.05), (30, 1.0), (60, 0.9)]
+# Boarding data (gate, boarding time) is prepared by `flask open-checkin` for flights departing within CHECKIN_OPENS
+app.config['CHECKIN_OPENS'] = timedelta(hours=48)
+app.config['BOARDING_STARTS'] = timedelta(minutes=40)  # before departure
+app.config['BOARDING_GROUPS'] = 4  # zones of seat rows, boarded back to front
+# PNRs handed out per database round trip (per worker)
+app.config['PNR_BLOCK_SIZE'] = int(os.environ.get('PNR_BLOCK_SIZE', 1000))
+# Rendered ticket PDFs, one file per booking version, evicted oldest-used first
+app.config['TICKET_CACHE_DIR'] = os.environ.get('TICKET_CACHE_DIR', os.path.join(app.instance_path, 'tickets'))
+app.config['TICKET_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+app.config['TICKET_RENDER_WORKERS'] = 2
+# Import the PDF/QR libraries in the background at startup instead of on the first download
+app.config['PRELOAD_RENDERERS'] = os.environ.get('PRELOAD_RENDERERS', '1') == '1'
+# Bulk ticket export renders in separate processes; at most EXPORT_WINDOW PDFs are in memory
+app.config['TICKET_EXPORT_WORKERS'] = os.cpu_count() or 2
+app.config['TICKET_EXPORT_WINDOW'] = 2 * app.config['TICKET_EXPORT_WORKERS']
+app.config['TICKET_EXPORT_BATCH'] = 200  # bookings fetched per round trip while exporting
+# Log an error and flag the response when a route runs more SQL statements than its query_budget
+app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+# Users allowed to use operations endpoints (comma separated usernames)
+app.config['OPS_USERNAMES'] = set(filter(None, os.environ.get('OPS_USERNAMES', '').split(',')))
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends reads to the 'replica' bind inside @read_replica routes; flushes and DML always go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            writing = self._flushing or getattr(clause, 'is_dml', False)
+            if writing:
+                g.db_wrote = True
+            elif g.get('db_replica') and 'replica' in self._db.engines:
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+# Passenger cabin as rendered by seats.html: rows A-T, seats 1-7
+SEAT_ROWS = 'ABCDEFGHIJKLMNOPQRST'
+SEATS_PER_ROW = 7
+SEAT_MAP_BYTES = (len(SEAT_ROWS) * SEATS_PER_ROW + 7) // 8
+SEAT_BLOCKS = ((0, 1), (2, 3, 4), (5, 6))  # Seat indexes within a row between the aisles (after seats 2 and 5)
 
 # Database Models
 class User(db.Model):
@@ -45,30 +180,114 @@ class Flight(db.Model):
     destination = db.Column(db.String(50), nullable=False)
     departure_time = db.Column(db.DateTime, nullable=False)
     arrival_time = db.Column(db.DateTime, nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # Current fare, recomputed by reprice_flights
+    # Fare before load-factor and time-to-departure adjustments; defaults to the first price
+    base_price = db.Column(db.Float, nullable=False,
+                           default=lambda context: context.get_current_parameters()['price'])
     total_seats = db.Column(db.Integer, nullable=False, default=180)
     available_seats = db.Column(db.Integer, nullable=False)
+    # One bit per cabin seat; claims are compare-and-set on seat_map_version
+    seat_map = db.Column(db.LargeBinary(SEAT_MAP_BYTES), nullable=False, default=bytes(SEAT_MAP_BYTES))
+    seat_map_version = db.Column(db.Integer, nullable=False, default=0)
     bookings = db.relationship('Booking', backref='flight', lazy=True)
 
+    # Route + date search: equality on the route, range on departure_time and
+    # available_seats checked from the index without touching the table row.
+    # price is included so the fare calendar is answered from the index alone.
+    __table_args__ = (
+        db.Index('ix_flight_route_departure', 'departure', 'destination',
+                 'departure_time', 'available_seats', 'price'),
+    )
+
+# Stands in for a NULL booking_date (older rows) so those bookings sort, and page, after every dated one
+UNKNOWN_BOOKING_DATE = "'0001-01-01 00:00:00.000000'"
+
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    flight_id = db.Column(db.Integer, db.ForeignKey('flight.id'), nullable=False)
+    flight_id = db.Column(db.Integer, db.ForeignKey('flight.id'), nullable=False, index=True)
     booking_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Confirmed')
     passenger_count = db.Column(db.Integer, nullable=False, default=1)  # Count of passengers
     pnr = db.Column(db.String(8), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped whenever the ticket content changes
+    fare = db.Column(db.Float)  # Per passenger, as quoted when the seats were taken; None on older bookings
     passengers = db.relationship('Passenger', backref='booking', lazy=True)  # List of passenger objects
 
+    # Booking history pages: a range read on one user's entries, newest first (see booking_history_date)
+    __table_args__ = (
+        db.Index('ix_booking_user_date', 'user_id', db.text(f"coalesce(booking_date, {UNKNOWN_BOOKING_DATE})"), 'id'),
+    )
+
+    @property
+    def total_price(self):
+        return (self.fare if self.fare is not None else self.flight.price) * self.passenger_count
+
+# Sort key of the booking history, the same expression as in ix_booking_user_date
+booking_history_date = db.func.coalesce(Booking.booking_date, db.literal_column(UNKNOWN_BOOKING_DATE, db.DateTime))
+
 class Passenger(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False, index=True)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(10), nullable=False)
     passport = db.Column(db.String(20))
     seat_number = db.Column(db.String(10))  # Added seat_number column
+    boarding_sequence = db.Column(db.Integer)  # Order of check-in on the flight; None until checked in
+
+class FlightBoarding(db.Model):
+    # Created once per flight when check-in opens; boarding passes and tickets read it by flight_id
+    flight_id = db.Column(db.Integer, db.ForeignKey('flight.id'), primary_key=True)
+    gate = db.Column(db.String(4), nullable=False)
+    boarding_time = db.Column(db.DateTime, nullable=False)
+    checked_in = db.Column(db.Integer, nullable=False, default=0)  # Last boarding sequence number handed out
+    opened_at = db.Column(db.DateTime, default=datetime.utcnow)
+    flight = db.relationship('Flight', backref=db.backref('boarding', uselist=False))
+
+class PnrSequence(db.Model):
+    # Single row: next unreserved sequence number and the secret key of the PNR permutation
+    id = db.Column(db.Integer, primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+    key = db.Column(db.String(64), nullable=False)
+
+class ScheduleDay(db.Model):
+    # Dates whose timetable has been generated, so extend_schedule never loads a day twice
+    date = db.Column(db.Date, primary_key=True)
+    flights = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SeatHold(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    flight_id = db.Column(db.Integer, db.ForeignKey('flight.id'), nullable=False)
+    seats = db.Column(db.Integer, nullable=False)
+    fare = db.Column(db.Float)  # Price quote per seat, read in the transaction that took the seats
+    status = db.Column(db.String(20), nullable=False, default='Active')  # Active, Converted, Expired, Released
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_seat_hold_status_expires', 'status', 'expires_at'),
+    )
+
+class BookingDraft(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON: flight, passengers, hold
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Seat hold expiry queue: (expires_at, hold_id, flight_id, seats), swept lazily.
+# Converted/released holds stay in the heap and are skipped when popped.
+hold_expiry_heap = []
+hold_heap_lock = threading.Lock()
+hold_heap_loaded = False
+hold_metrics = {'created': 0, 'expired': 0, 'converted': 0, 'released': 0}
+hold_metrics_lock = threading.Lock()
+
+def count_holds(event, n=1):
+    with hold_metrics_lock:
+        hold_metrics[event] += n
 
 # Template filters and context processors
 @app.template_filter('duration')
@@ -89,6 +308,77 @@ def inject_datetime():
         'today': datetime.now().strftime('%Y-%m-%d')
     }
 
+# Per-request SQL instrumentation: statement count and DB time per endpoint
+query_budgets = {}
+query_metrics = {}
+query_metrics_lock = threading.Lock()
+
+def query_budget(limit):
+    # Maximum SQL statements a route may run in one request
+    def decorator(f):
+        query_budgets[f.__name__] = limit
+        return f
+    return decorator
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; NORMAL is durable enough under WAL
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + time.perf_counter() - context.query_started
+
+@app.after_request
+def report_queries(response):
+    endpoint = request.endpoint or 'unknown'
+    count, elapsed = g.get('query_count', 0), g.get('query_time', 0.0)
+    with query_metrics_lock:
+        stats = query_metrics.setdefault(endpoint, {'requests': 0, 'queries': 0, 'db_seconds': 0.0, 'max_queries': 0})
+        stats['requests'] += 1
+        stats['queries'] += count
+        stats['db_seconds'] += elapsed
+        stats['max_queries'] = max(stats['max_queries'], count)
+    app.logger.debug(f"{endpoint}: {count} queries, {elapsed * 1000:.1f} ms in database")
+
+    budget = query_budgets.get(endpoint)
+    if budget is not None and count > budget:
+        message = f"{endpoint} ran {count} queries (budget {budget})"
+        if app.config['QUERY_BUDGET_STRICT'] or app.testing:
+            # The view may already have committed, so flag the response rather than turn it into a 500
+            app.logger.error(message)
+            response.headers['X-Query-Budget-Exceeded'] = f"{count}/{budget}"
+        else:
+            app.logger.warning(message)
+    if app.testing:
+        response.headers['X-Query-Count'] = str(count)
+    return response
+
+def seat_holds_due():
+    # Cheap peek at the earliest expiry; the database is only touched when a hold is due
+    return not hold_heap_loaded or bool(hold_expiry_heap and hold_expiry_heap[0][0] <= datetime.utcnow())
+
+@app.before_request
+def sweep_seat_holds():
+    if seat_holds_due():
+        query_count = g.get('query_count', 0)
+        try:
+            expire_seat_holds()
+        except SQLAlchemyError as e:
+            print(f"[ERROR] expire_seat_holds: {e}")
+        g.query_count = query_count  # Housekeeping is not charged to the route's query budget
+
 # Authentication decorator
 def login_required(f):
     @wraps(f)
@@ -99,16 +389,1475 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def ops_required(f):
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if session.get('username') not in app.config['OPS_USERNAMES']:
+            return jsonify({'success': False, 'error': 'Operations access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+class PasswordHashingBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Password hashing and verification on a bounded thread pool.
+
+    At most `workers` hashes run at once (hashlib releases the GIL, so they
+    use real cores); `queue_size` more may wait. A login that can't get a
+    place within `wait_seconds` raises PasswordHashingBusy instead of piling
+    up behind a credential-stuffing burst.
+    """
+
+    def __init__(self, method, workers, queue_size, wait_seconds):
+        self.method = method
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.wait_seconds = wait_seconds
+        self.dummy_hash = None
+        self.lock = threading.Lock()
+        self.stats = {'hashes': 0, 'hash_seconds': 0.0, 'max_hash_seconds': 0.0, 'shed': 0, 'rehashed': 0}
+
+    def _timed(self, f, *args):
+        started = time.perf_counter()
+        try:
+            return f(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.stats['hashes'] += 1
+                self.stats['hash_seconds'] += elapsed
+                self.stats['max_hash_seconds'] = max(self.stats['max_hash_seconds'], elapsed)
+
+    def _run(self, f, *args):
+        if not self.slots.acquire(timeout=self.wait_seconds):
+            with self.lock:
+                self.stats['shed'] += 1
+            raise PasswordHashingBusy()
+        try:
+            return self.executor.submit(self._timed, f, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        # Unknown users are checked against a dummy hash so they cost (and take) as long as real ones
+        if stored_hash is None:
+            if self.dummy_hash is None:
+                self.dummy_hash = self.hash(secrets.token_hex(16))
+            self._run(check_password_hash, self.dummy_hash, password)
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def rehash(self, password):
+        # A successful login's password under the current method
+        password_hash = self.hash(password)
+        with self.lock:
+            self.stats['rehashed'] += 1
+        return password_hash
+
+    def needs_rehash(self, stored_hash):
+        if self.dummy_hash is None:
+            self.dummy_hash = self.hash(secrets.token_hex(16))
+        # "scrypt:32768:8:1$salt$hash": compare the method and its parameters
+        return stored_hash.split('$', 1)[0] != self.dummy_hash.split('$', 1)[0]
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_hash_ms'] = round(stats['hash_seconds'] / stats['hashes'] * 1000, 2) if stats['hashes'] else None
+        return dict(stats, method=self.method)
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `burst` attempts at once, refilled at `rate` per second.
+
+    In memory and per worker; the least recently seen keys are dropped past `max_keys`.
+    """
+
+    def __init__(self, burst, rate, max_keys=100000):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            else:
+                self.rejected += 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return allowed
+
+    def refund(self, key):
+        # Give back the token an allowed attempt took
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated_at = self.buckets[key]
+                self.buckets[key] = (min(self.burst, tokens + 1), updated_at)
+
+    def reset(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                 app.config['PASSWORD_HASH_QUEUE'], app.config['PASSWORD_HASH_WAIT'])
+login_username_limiter = TokenBucketLimiter(app.config['LOGIN_USERNAME_BURST'], app.config['LOGIN_USERNAME_RATE'])
+login_ip_limiter = TokenBucketLimiter(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_RATE'])
+
+# Airports offered by the search form (home.html), which submits "City (CODE)"
+AIRPORTS = {
+    'DEL': 'Delhi', 'VTZ': 'Visakhapatnam', 'BOM': 'Mumbai', 'BLR': 'Bangalore', 'HYD': 'Hyderabad',
+    'MAA': 'Chennai', 'CCU': 'Kolkata', 'AMD': 'Ahmedabad', 'PNQ': 'Pune', 'GOI': 'Goa', 'COK': 'Kochi',
+    'JAI': 'Jaipur', 'LKO': 'Lucknow', 'VNS': 'Varanasi', 'GAU': 'Guwahati', 'PAT': 'Patna',
+    'BBI': 'Bhubaneswar', 'NAG': 'Nagpur', 'IDR': 'Indore', 'CJB': 'Coimbatore', 'TRV': 'Trivandrum',
+    'IXE': 'Mangalore', 'BDQ': 'Vadodara', 'ATQ': 'Amritsar', 'DED': 'Dehradun', 'IXR': 'Ranchi',
+    'RPR': 'Raipur', 'JDH': 'Jodhpur', 'UDR': 'Udaipur', 'SXR': 'Srinagar', 'IXL': 'Leh'
+}
+AIRLINES = ['AirIndia', 'United', 'Delta', 'American', 'British Airways']
+
+def read_replica(f):
+    # Route this view's reads to the replica unless the user wrote something moments ago
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_replica = session.get('primary_reads_until', 0) < time.time()
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.after_request
+def pin_reads_after_write(response):
+    if g.get('db_wrote') and 'user_id' in session and 'replica' in db.engines:
+        session['primary_reads_until'] = time.time() + app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+    return response
+
 # Helper functions
-def generate_flight_number():
+def airport_code(value):
+    # "Delhi (DEL)" -> "DEL"; bare codes pass through
+    value = (value or '').strip()
+    if value.endswith(')') and '(' in value:
+        value = value[value.rindex('(') + 1:-1]
+    return value.upper()
+
+def generate_flight_number(rng=random):
     airlines = ['AI', 'UA', 'DL', 'AA', 'BA']
-    return f"{random.choice(airlines)}{random.randint(100, 999)}"
-
-def generate_flight_price():
-    return round(random.uniform(5000, 15000), 2)
+    return f"{rng.choice(airlines)}{rng.randint(100, 999)}"
+
+def generate_flight_price(rng=random):
+    return round(rng.uniform(5000, 15000), 2)
+
+def flight_search_criteria(departure, destination, travel_date, passengers):
+    # Half-open range on the raw column so SQLite can use ix_flight_route_departure
+    # (wrapping departure_time in date() forces a full scan)
+    day_start = datetime.combine(travel_date, datetime.min.time())
+    return [
+        Flight.departure == departure,
+        Flight.destination == destination,
+        Flight.departure_time >= day_start,
+        Flight.departure_time < day_start + timedelta(days=1),
+        Flight.available_seats >= passengers
+    ]
+
+def fare_calendar_query(departure, destination, start_date, end_date, passengers):
+    # One grouped aggregate over the route's index range (price is in the index, so no table reads)
+    day = db.func.date(Flight.departure_time)
+    return db.select(
+        day.label('day'),
+        db.func.min(Flight.price).label('min_price'),
+        db.func.count().label('flights'),
+        db.func.max(Flight.available_seats).label('max_available_seats')
+    ).where(
+        Flight.departure == departure,
+        Flight.destination == destination,
+        Flight.departure_time >= datetime.combine(start_date, datetime.min.time()),
+        Flight.departure_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        Flight.available_seats >= passengers
+    ).group_by(day)
+
+def fare_calendar_days(rows, start_date, end_date):
+    # Every date in the window, with None/0 for days without a bookable flight
+    by_day = {str(row.day)[:10]: row for row in rows}
+    days = []
+    for n in range((end_date - start_date).days + 1):
+        date = (start_date + timedelta(days=n)).isoformat()
+        row = by_day.get(date)
+        days.append({
+            'date': date,
+            'min_price': row.min_price if row else None,
+            'flights': row.flights if row else 0,
+            'max_available_seats': row.max_available_seats if row else 0
+        })
+    return days
+
+def fare_calendar_window(travel_date, days):
+    # travel_date +- days, never before today
+    days = max(0, min(days, app.config['FARE_CALENDAR_MAX_DAYS']))
+    return max(travel_date - timedelta(days=days), datetime.now().date()), travel_date + timedelta(days=days)
+
+def booking_history_criteria(user_id, cursor=None):
+    """Filters for one page of a user's bookings, newest first (order by booking_date, id descending).
+
+    `cursor` is the booking_history_cursor of the last booking on the previous
+    page; the page starts right after it, so each page is one index range read
+    on ix_booking_user_date however deep it is. Raises ValueError for a bad cursor.
+    """
+    criteria = [Booking.user_id == user_id]
+    if cursor:
+        booking_date, _, booking_id = cursor.rpartition('_')
+        booking_date, booking_id = datetime.fromisoformat(booking_date), int(booking_id)
+        # (date, id) < cursor, spelled so SQLite can range-read the expression index
+        criteria += [booking_history_date <= booking_date,
+                     db.or_(booking_history_date < booking_date, Booking.id < booking_id)]
+    return criteria
+
+def booking_history_cursor(booking_date, booking_id):
+    # datetime.min is UNKNOWN_BOOKING_DATE, so a NULL-dated last row still makes a valid cursor
+    return f"{(booking_date or datetime.min).isoformat()}_{booking_id}"
+
+class PnrAllocator:
+    """Unique 8-character PNRs without a uniqueness check per booking.
+
+    Each worker reserves a block of sequence numbers with one committed
+    UPDATE, then maps every number through a keyed Feistel permutation of
+    [0, 36**8) and writes it in base 36. A permutation never maps two numbers
+    to the same value, so PNRs are unique across workers yet look random.
+    """
+
+    ALPHABET = string.digits + string.ascii_uppercase
+    HALF = 36 ** 4  # Feistel halves; 36**8 == HALF * HALF
+    ROUNDS = 4
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.key = None
+        self.next_value = self.end_value = 0
+        self.lock = threading.Lock()
+
+    def reserve_block(self):
+        # Own transaction: the block must stay reserved even if the booking rolls back
+        try:
+            row = self._increment()
+        except IntegrityError:
+            row = self._increment()  # Another worker created the sequence row first
+        self.key = bytes.fromhex(row.key)
+        self.end_value = row.next_value
+        self.next_value = row.next_value - self.block_size
+
+    def _increment(self):
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                db.update(PnrSequence).where(PnrSequence.id == 1)
+                .values(next_value=PnrSequence.next_value + self.block_size)
+            )
+            if result.rowcount == 0:
+                conn.execute(db.insert(PnrSequence).values(
+                    id=1, next_value=self.block_size, key=secrets.token_hex(32)))
+            return conn.execute(db.select(PnrSequence.next_value, PnrSequence.key)
+                                .where(PnrSequence.id == 1)).one()
+
+    def permute(self, value):
+        left, right = divmod(value, self.HALF)
+        for round_number in range(self.ROUNDS):
+            digest = hashlib.blake2b(right.to_bytes(3, 'big') + bytes([round_number]),
+                                     key=self.key, digest_size=8).digest()
+            left, right = right, (left + int.from_bytes(digest, 'big')) % self.HALF
+        return left * self.HALF + right
+
+    def encode(self, value):
+        chars = []
+        for _ in range(8):
+            value, digit = divmod(value, 36)
+            chars.append(self.ALPHABET[digit])
+        return ''.join(reversed(chars))
+
+    def allocate(self):
+        with self.lock:
+            if self.next_value >= self.end_value:
+                self.reserve_block()
+            value = self.next_value
+            self.next_value += 1
+        return self.encode(self.permute(value))
+
+pnr_allocator = PnrAllocator(app.config['PNR_BLOCK_SIZE'])
 
 def generate_pnr():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    return pnr_allocator.allocate()
+
+class SeatMapContention(Exception):
+    pass
+
+def retry_on_db_lock(f):
+    # Re-run a whole unit of work when SQLite reports a lock timeout or a seat map claim keeps losing
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        retries = app.config['DB_LOCK_RETRIES']
+        for attempt in range(retries + 1):
+            try:
+                return f(*args, **kwargs)
+            except (OperationalError, SeatMapContention) as e:
+                db.session.rollback()
+                locked = isinstance(e, SeatMapContention) or 'database is locked' in str(e)
+                if not locked or attempt == retries:
+                    raise
+                delay = app.config['DB_LOCK_BACKOFF'] * (2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    return decorated_function
+
+def reserve_flight_seats(flight_id, count):
+    # Conditional decrement done by the database; never oversells under concurrency
+    result = db.session.execute(
+        db.update(Flight)
+        .where(Flight.id == flight_id, Flight.available_seats >= count)
+        .values(available_seats=Flight.available_seats - count)
+    )
+    return result.rowcount == 1
+
+def seat_index(seat):
+    # 'A1' -> 0 ... 'T7' -> 139; ValueError for anything outside the grid
+    row, col = seat[:1], seat[1:]
+    if row not in SEAT_ROWS or not row or not col.isdigit() or not 1 <= int(col) <= SEATS_PER_ROW:
+        raise ValueError(f"Invalid seat {seat}")
+    return SEAT_ROWS.index(row) * SEATS_PER_ROW + int(col) - 1
+
+def is_valid_seat(seat):
+    try:
+        seat_index(seat)
+    except ValueError:
+        return False
+    return True
+
+def seat_mask(seats):
+    mask = 0
+    for seat in seats:
+        mask |= 1 << seat_index(seat)
+    return mask
+
+def occupied_seats(seat_map):
+    bits = int.from_bytes(seat_map, 'big')
+    return [f"{row}{col}"
+            for r, row in enumerate(SEAT_ROWS)
+            for col in range(1, SEATS_PER_ROW + 1)
+            if bits >> (r * SEATS_PER_ROW + col - 1) & 1]
+
+def claim_flight_seats(flight_id, claim, release=()):
+    """Atomically free `release` and take `claim` on the flight's seat map.
+
+    Returns False if any claimed seat is held by someone else. A lost
+    compare-and-set means another writer made progress, so it is retried, up
+    to SEAT_CLAIM_ATTEMPTS times: under REPEATABLE READ (MySQL) the re-read
+    sees the same snapshot and would never win, so after that
+    SeatMapContention is raised for retry_on_db_lock to start a new transaction.
+    """
+    claim_mask, release_mask = seat_mask(claim), seat_mask(release)
+    for _ in range(app.config['SEAT_CLAIM_ATTEMPTS']):
+        current = db.session.execute(
+            db.select(Flight.seat_map, Flight.seat_map_version).where(Flight.id == flight_id)
+        ).one()
+        bits = int.from_bytes(current.seat_map, 'big') & ~release_mask
+        if bits & claim_mask:
+            return False
+
+        result = db.session.execute(
+            db.update(Flight)
+            .where(Flight.id == flight_id, Flight.seat_map_version == current.seat_map_version)
+            .values(seat_map=(bits | claim_mask).to_bytes(SEAT_MAP_BYTES, 'big'),
+                    seat_map_version=Flight.seat_map_version + 1)
+        )
+        if result.rowcount == 1:
+            return True
+    raise SeatMapContention(f"Seat map of flight {flight_id} kept changing")
+
+@retry_on_db_lock
+def assign_seats(booking, seats):
+    # Seats go to passengers in order; their previous seats are given back. Seat numbers from before
+    # the seat map (save_seats used to accept any string) were never in it, so there is nothing to free
+    passengers = booking.passengers[:len(seats)]
+    released = [p.seat_number for p in passengers if p.seat_number and is_valid_seat(p.seat_number)]
+    if not claim_flight_seats(booking.flight_id, seats, released):
+        db.session.rollback()
+        return False
+
+    for passenger, seat in zip(passengers, seats):
+        passenger.seat_number = seat
+    booking.version += 1
+    db.session.commit()
+    return True
+
+def row_placements():
+    """Best seats for every party size in every possible row, keyed by the row's 7-bit occupancy.
+
+    placements[occupancy][size] is (cost, mask) or None. Cost prefers seats
+    between the same pair of aisles, then the fewest seats left stranded in
+    the blocks used (best fit); ties go to the lowest seat number.
+    """
+    placements = []
+    for occupancy in range(1 << SEATS_PER_ROW):
+        by_size = [None]
+        for size in range(1, SEATS_PER_ROW + 1):
+            best = None
+            for start in range(SEATS_PER_ROW - size + 1):
+                mask = ((1 << size) - 1) << start
+                if occupancy & mask:
+                    continue
+                blocks = [block for block in SEAT_BLOCKS if any(start <= i < start + size for i in block)]
+                stranded = sum(1 for block in blocks for i in block if not (occupancy | mask) >> i & 1)
+                cost = (len(blocks) - 1, stranded)
+                if best is None or cost < best[0]:
+                    best = (cost, mask)
+            by_size.append(best)
+        placements.append(by_size)
+    return placements
+
+ROW_PLACEMENTS = row_placements()
+# Longest run of free adjacent seats in a row, by occupancy
+ROW_LONGEST_RUN = [max((size for size in range(1, SEATS_PER_ROW + 1) if by_size[size]), default=0)
+                   for by_size in ROW_PLACEMENTS]
+
+def allocate_seats(seat_map, parties):
+    """Choose seats for parties of passengers on one flight, without touching the database.
+
+    `parties` is a list of passenger id lists, one per booking. Larger parties
+    are placed first, each in the row where it fits best (front rows win
+    ties); a party too big for any row is split over the longest free runs,
+    nearest rows first.
+    Returns {passenger_id: seat} for everyone who got a seat (the cabin may
+    run out before the passenger list does).
+    """
+    bits = int.from_bytes(seat_map, 'big')
+    row_mask = (1 << SEATS_PER_ROW) - 1
+    rows = [bits >> (r * SEATS_PER_ROW) & row_mask for r in range(len(SEAT_ROWS))]
+    assignments = {}
+
+    for party in sorted(parties, key=len, reverse=True):
+        seats = []  # (row, index within row) in passenger order
+        best = None
+        if len(party) <= SEATS_PER_ROW:
+            for r, occupancy in enumerate(rows):
+                placement = ROW_PLACEMENTS[occupancy][len(party)]
+                if placement and (best is None or placement[0] < best[0]):
+                    best = (placement[0], r, placement[1])
+        if best:
+            _, r, mask = best
+            rows[r] |= mask
+            seats = [(r, i) for i in range(SEATS_PER_ROW) if mask >> i & 1]
+        else:
+            anchor = None
+            while len(seats) < len(party):
+                remaining = len(party) - len(seats)
+                candidates = [(-min(ROW_LONGEST_RUN[occupancy], remaining), abs(r - anchor) if anchor is not None else r, r)
+                              for r, occupancy in enumerate(rows) if ROW_LONGEST_RUN[occupancy]]
+                if not candidates:
+                    break  # Cabin full
+                chunk, _, r = min(candidates)
+                _, mask = ROW_PLACEMENTS[rows[r]][-chunk]
+                rows[r] |= mask
+                seats += [(r, i) for i in range(SEATS_PER_ROW) if mask >> i & 1]
+                anchor = r if anchor is None else anchor
+
+        for passenger_id, (r, i) in zip(party, seats):
+            assignments[passenger_id] = f"{SEAT_ROWS[r]}{i + 1}"
+    return assignments
+
+@retry_on_db_lock
+def seat_flight(flight_id, parties):
+    """Seat one flight's parties ([(booking_id, [passenger_id, ...]), ...]) in a single transaction.
+
+    The seats are chosen from the current seat map and claimed with
+    claim_flight_seats; if a passenger picked one of them in the meantime the
+    allocation is redone from the fresh map. A passenger who picked a seat of
+    their own after being read keeps it, and the seat chosen for them is given
+    back. Returns ({passenger_id: seat} for the passengers seated here, number
+    of passengers who had picked a seat themselves).
+    """
+    passengers, bookings = Passenger.__table__, Booking.__table__
+    while True:
+        seat_map = db.session.scalar(db.select(Flight.seat_map).where(Flight.id == flight_id))
+        assignments = allocate_seats(seat_map, [party for _, party in parties])
+        if claim_flight_seats(flight_id, assignments.values()):
+            break
+        db.session.rollback()
+
+    picked = []
+    if assignments:
+        db.session.execute(
+            passengers.update().where(passengers.c.id == db.bindparam('passenger_id'),
+                                      passengers.c.seat_number.is_(None))
+            .values(seat_number=db.bindparam('seat')),
+            [{'passenger_id': passenger_id, 'seat': seat} for passenger_id, seat in assignments.items()])
+        # Passengers who chose a seat through save_seats since they were read kept it; free ours
+        seats = dict(db.session.execute(
+            db.select(passengers.c.id, passengers.c.seat_number).where(passengers.c.id.in_(list(assignments)))
+        ).all())
+        picked = [passenger_id for passenger_id, seat in assignments.items() if seats[passenger_id] != seat]
+        if picked:
+            claim_flight_seats(flight_id, [], release=[assignments.pop(passenger_id) for passenger_id in picked])
+        # New ticket version so the PDF is rendered again with the seats
+        db.session.execute(
+            bookings.update().where(bookings.c.id == db.bindparam('booking_id'))
+            .values(version=bookings.c.version + 1),
+            [{'booking_id': booking_id} for booking_id, party in parties
+             if any(passenger_id in assignments for passenger_id in party)])
+    db.session.commit()
+    return assignments, len(picked)
+
+def auto_seat_flights(*criteria, flights_per_query=500, progress=None):
+    """Seat every passenger without a seat on the flights matching `criteria` (Flight filters).
+
+    Passengers are read for `flights_per_query` flights at a time, grouped by
+    booking, and each flight is seated in its own transaction by seat_flight.
+    `progress(flights, seated, seconds)` is called after each query batch.
+    Returns (flights with passengers to seat, seated, unseated, seconds).
+    """
+    started = time.perf_counter()
+    flight_ids = db.session.scalars(db.select(Flight.id).where(*criteria).order_by(Flight.id)).all()
+    flights = seated = unseated = 0
+    for start in range(0, len(flight_ids), flights_per_query):
+        rows = db.session.execute(
+            db.select(Booking.flight_id, Booking.id, Passenger.id)
+            .join(Passenger, Passenger.booking_id == Booking.id)
+            .where(Booking.flight_id.in_(flight_ids[start:start + flights_per_query]),
+                   Passenger.seat_number.is_(None))
+            .order_by(Booking.flight_id, Booking.id, Passenger.id)
+        ).all()
+        for flight_id, flight_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            parties = [(booking_id, [row[2] for row in booking_rows])
+                       for booking_id, booking_rows in itertools.groupby(flight_rows, key=lambda row: row[1])]
+            assignments, picked = seat_flight(flight_id, parties)
+            flights += 1
+            seated += len(assignments)
+            unseated += sum(len(party) for _, party in parties) - len(assignments) - picked
+        if progress:
+            progress(flights, seated, time.perf_counter() - started)
+    return flights, seated, unseated, time.perf_counter() - started
+
+def flight_gate(flight):
+    # Derived from the flight number, origin and day, so every worker and every run picks the same gate
+    digest = hashlib.sha256(
+        f"{flight.flight_number}:{flight.departure}:{flight.departure_time.date()}".encode()).digest()
+    n = int.from_bytes(digest[:4], 'big')
+    return f"{'ABC'[n % 3]}{n // 3 % 30 + 1}"
+
+def boarding_row(flight):
+    return {
+        'flight_id': flight.id,
+        'gate': flight_gate(flight),
+        'boarding_time': flight.departure_time - app.config['BOARDING_STARTS'],
+        'checked_in': 0
+    }
+
+def boarding_group(seat_number):
+    # Back rows board first; passengers without a seat board last
+    groups = app.config['BOARDING_GROUPS']
+    if not seat_number:
+        return groups
+    return groups - seat_index(seat_number) // SEATS_PER_ROW * groups // len(SEAT_ROWS)
+
+def open_checkin(*criteria, batch_size=5000):
+    """Create the boarding data of every flight matching `criteria` (Flight filters) that has none yet.
+
+    One executemany and commit per batch. Returns the number of flights opened.
+    """
+    opened = last_id = 0
+    while True:
+        flights = db.session.execute(
+            db.select(Flight.id, Flight.flight_number, Flight.departure, Flight.departure_time)
+            .outerjoin(FlightBoarding, FlightBoarding.flight_id == Flight.id)
+            .where(FlightBoarding.flight_id.is_(None), Flight.id > last_id, *criteria)
+            .order_by(Flight.id)
+            .limit(batch_size)
+        ).all()
+        if not flights:
+            return opened
+        try:
+            db.session.execute(FlightBoarding.__table__.insert(), [boarding_row(flight) for flight in flights])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # A check-in opened one of them first; the next query skips it
+            continue
+        opened += len(flights)
+        last_id = flights[-1].id
+
+def assign_boarding_sequence(booking):
+    """Number the booking's passengers in check-in order on their flight, in the caller's transaction.
+
+    Opens the flight's boarding data if `flask open-checkin` has not reached it yet.
+    """
+    passengers = [p for p in booking.passengers if p.boarding_sequence is None]
+    if not passengers:
+        return
+
+    def take_numbers():
+        return db.session.execute(
+            db.update(FlightBoarding).where(FlightBoarding.flight_id == booking.flight_id)
+            .values(checked_in=FlightBoarding.checked_in + len(passengers))
+        ).rowcount == 1
+
+    if not take_numbers():
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(FlightBoarding).values(
+                    dict(boarding_row(booking.flight), checked_in=len(passengers))))
+        except IntegrityError:
+            take_numbers()  # Another check-in opened the flight first
+    last = db.session.scalar(db.select(FlightBoarding.checked_in).where(FlightBoarding.flight_id == booking.flight_id))
+    for sequence, passenger in enumerate(passengers, start=last - len(passengers) + 1):
+        passenger.boarding_sequence = sequence
+
+def boarding_details(booking):
+    """Gate, boarding time and each passenger's group and sequence number, as plain data.
+
+    Flights whose check-in has not opened yet show the gate they will get,
+    without storing it.
+    """
+    flight, boarding = booking.flight, booking.flight.boarding
+    return {
+        'gate': boarding.gate if boarding else flight_gate(flight),
+        'boarding_time': boarding.boarding_time if boarding else flight.departure_time - app.config['BOARDING_STARTS'],
+        'passengers': [{'group': boarding_group(p.seat_number), 'sequence': p.boarding_sequence}
+                       for p in booking.passengers]
+    }
+
+@lru_cache(maxsize=None)
+def template_digest(*names):
+    # Part of response ETags, so a deploy with changed templates never revalidates old pages
+    return hashlib.sha256(''.join(
+        app.jinja_env.loader.get_source(app.jinja_env, name)[0] for name in names).encode()).hexdigest()[:16]
+
+def load_hold_heap():
+    # Pick up holds left active by a previous process
+    global hold_heap_loaded
+    with hold_heap_lock:
+        if hold_heap_loaded:
+            return
+        rows = db.session.execute(
+            db.select(SeatHold.expires_at, SeatHold.id, SeatHold.flight_id, SeatHold.seats)
+            .where(SeatHold.status == 'Active')
+        ).all()
+        hold_expiry_heap.extend(tuple(row) for row in rows)
+        heapq.heapify(hold_expiry_heap)
+        hold_heap_loaded = True
+
+@retry_on_db_lock
+def expire_seat_holds(now=None):
+    """Return seats of every hold whose TTL has passed. O(log n) per expired hold."""
+    load_hold_heap()
+    now = now or datetime.utcnow()
+    with hold_heap_lock:
+        due = []
+        while hold_expiry_heap and hold_expiry_heap[0][0] <= now:
+            due.append(heapq.heappop(hold_expiry_heap))
+    if not due:
+        return 0
+
+    expired = 0
+    try:
+        routes = flight_route_keys({flight_id for _, _, flight_id, _ in due})
+        for expires_at, hold_id, flight_id, seats in due:
+            result = db.session.execute(
+                db.update(SeatHold)
+                .where(SeatHold.id == hold_id, SeatHold.status == 'Active')
+                .values(status='Expired')
+            )
+            if result.rowcount == 1:
+                db.session.execute(
+                    db.update(Flight)
+                    .where(Flight.id == flight_id)
+                    .values(available_seats=Flight.available_seats + seats)
+                )
+                expired += 1
+        db.session.commit()
+        invalidate_searches(routes)
+    except Exception:
+        db.session.rollback()
+        with hold_heap_lock:
+            for entry in due:
+                heapq.heappush(hold_expiry_heap, entry)
+        raise
+
+    count_holds('expired', expired)
+    return expired
+
+@retry_on_db_lock
+def place_seat_hold(user_id, flight_id, seats):
+    """Take `seats` out of the flight's inventory for SEAT_HOLD_TTL. None if sold out."""
+    routes = flight_route_keys([flight_id])
+    if not reserve_flight_seats(flight_id, seats):
+        db.session.rollback()
+        return None
+
+    hold = SeatHold(
+        user_id=user_id,
+        flight_id=flight_id,
+        seats=seats,
+        # Same transaction as the seat update, so the quote can't interleave with a repricing batch
+        fare=db.session.scalar(db.select(Flight.price).where(Flight.id == flight_id)),
+        expires_at=datetime.utcnow() + app.config['SEAT_HOLD_TTL']
+    )
+    db.session.add(hold)
+    db.session.commit()
+    invalidate_searches(routes)
+
+    with hold_heap_lock:
+        heapq.heappush(hold_expiry_heap, (hold.expires_at, hold.id, flight_id, seats))
+    count_holds('created')
+    return hold
+
+@retry_on_db_lock
+def release_seat_hold(hold_id):
+    hold = db.session.get(SeatHold, hold_id)
+    if not hold:
+        return False
+    result = db.session.execute(
+        db.update(SeatHold)
+        .where(SeatHold.id == hold_id, SeatHold.status == 'Active')
+        .values(status='Released')
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+    routes = flight_route_keys([hold.flight_id])
+    db.session.execute(
+        db.update(Flight)
+        .where(Flight.id == hold.flight_id)
+        .values(available_seats=Flight.available_seats + hold.seats)
+    )
+    db.session.commit()
+    invalidate_searches(routes)
+    count_holds('released')
+    return True
+
+def convert_seat_hold(hold_id, user_id, flight_id, seats):
+    # Marks a live hold as used; its seats were already taken out of inventory
+    result = db.session.execute(
+        db.update(SeatHold)
+        .where(SeatHold.id == hold_id,
+               SeatHold.user_id == user_id,
+               SeatHold.flight_id == flight_id,
+               SeatHold.seats == seats,
+               SeatHold.status == 'Active',
+               SeatHold.expires_at > datetime.utcnow())
+        .values(status='Converted')
+    )
+    return result.rowcount == 1
+
+@retry_on_db_lock
+def create_booking(user_id, booking_data):
+    """Claim seats and write the booking in one transaction. Returns None if sold out.
+
+    Seats come from the booking's hold when it is still live, otherwise they
+    are taken from the flight's remaining inventory.
+    """
+    pnr = generate_pnr()  # Before any write: a block reservation commits on its own connection
+    routes = flight_route_keys([booking_data['flight_id']])
+    hold_id = booking_data.get('hold_id')
+    converted = hold_id is not None and convert_seat_hold(
+        hold_id, user_id, booking_data['flight_id'], booking_data['num_passengers'])
+    if not converted and not reserve_flight_seats(booking_data['flight_id'], booking_data['num_passengers']):
+        db.session.rollback()
+        return None
+    # Charge the fare quoted with the hold; without one, the price at the moment the seats were taken
+    fare = db.session.scalar(db.select(SeatHold.fare).where(SeatHold.id == hold_id)) if converted else None
+    if fare is None:
+        fare = db.session.scalar(db.select(Flight.price).where(Flight.id == booking_data['flight_id']))
+
+    booking = Booking(
+        user_id=user_id,
+        flight_id=booking_data['flight_id'],
+        passenger_count=booking_data['num_passengers'],  # Use passenger_count
+        pnr=pnr,
+        fare=fare,
+        status='Confirmed'
+    )
+    db.session.add(booking)
+    db.session.flush()
+
+    for passenger_data in booking_data['passengers']:
+        passenger = Passenger(
+            booking_id=booking.id,
+            first_name=passenger_data['first_name'],
+            last_name=passenger_data['last_name'],
+            age=passenger_data['age'],
+            gender=passenger_data['gender'],
+            passport=passenger_data.get('passport')
+        )
+        db.session.add(passenger)
+
+    db.session.commit()
+    if converted:
+        count_holds('converted')
+    else:
+        invalidate_searches(routes)  # A converted hold already took its seats out of search results
+    return booking
+
+class LRUTTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being set."""
+
+    def __init__(self, max_entries, ttl, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict  # Called with the key of every entry dropped for size or age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expired = entry[0] <= time.monotonic()
+            if expired:
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+        if expired:
+            if self.on_evict:
+                self.on_evict(key)
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        if self.on_evict:
+            for evicted_key in evicted:
+                self.on_evict(evicted_key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+class SearchCache:
+    """Flight search results keyed by (departure, destination, date, passengers).
+
+    Entries are indexed by route and date so a seat change or a new flight
+    evicts only the searches that could include it. Every invalidation also
+    bumps the route's generation: a miss reads `generation(key)` before it
+    queries and passes it to `set`, which drops the result if the route was
+    invalidated in between, since it may hold the old seat counts.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.cache = LRUTTLCache(max_entries, ttl, on_evict=self._forget)
+        self.routes = {}  # (departure, destination, date) -> cache keys
+        self.generations = {}  # route -> counter value at its last invalidation
+        self.counter = 0
+        self.floor = 0  # Generation of every route not in `generations`
+        self.lock = threading.RLock()  # set() holds it while the cache evicts into _forget
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'hit_seconds': 0.0, 'miss_seconds': 0.0}
+
+    def _forget(self, key):
+        with self.lock:
+            keys = self.routes.get(key[:3])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.routes[key[:3]]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def generation(self, key):
+        with self.lock:
+            return self.generations.get(key[:3], self.floor)
+
+    def set(self, key, flights, generation):
+        with self.lock:
+            if self.generations.get(key[:3], self.floor) != generation:
+                return  # Invalidated while this result was being read
+            self.cache.set(key, flights)
+            self.routes.setdefault(key[:3], set()).add(key)
+
+    def invalidate(self, route):
+        with self.lock:
+            keys = self.routes.pop(route, ())
+            self.counter += 1
+            if len(self.generations) >= self.cache.max_entries:
+                # Forget per-route generations; every route now compares against the new floor
+                self.generations.clear()
+                self.floor = self.counter
+            else:
+                self.generations[route] = self.counter
+        for key in keys:
+            self.cache.pop(key)
+        with self.lock:
+            self.stats['invalidations'] += len(keys)
+
+    def record(self, hit, seconds):
+        with self.lock:
+            if hit:
+                self.stats['hits'] += 1
+                self.stats['hit_seconds'] += seconds
+            else:
+                self.stats['misses'] += 1
+                self.stats['miss_seconds'] += seconds
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        hits, misses = stats['hits'], stats['misses']
+        return {
+            'entries': len(self.cache),
+            'hits': hits,
+            'misses': misses,
+            'invalidations': stats['invalidations'],
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'avg_hit_ms': round(stats['hit_seconds'] / hits * 1000, 3) if hits else None,
+            'avg_miss_ms': round(stats['miss_seconds'] / misses * 1000, 3) if misses else None
+        }
+
+search_cache = SearchCache(app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL'])
+
+def search_route_key(departure, destination, departure_time):
+    return (departure, destination, departure_time.date())
+
+def flight_route_keys(flight_ids):
+    # Route/date of each flight whose inventory is about to change; identity map first
+    keys = set()
+    missing = []
+    for flight_id in flight_ids:
+        flight = db.session.identity_map.get(db.inspect(Flight).identity_key_from_primary_key((flight_id,)))
+        if flight is not None and 'departure_time' in flight.__dict__:
+            keys.add(search_route_key(flight.departure, flight.destination, flight.departure_time))
+        else:
+            missing.append(flight_id)
+    if missing:
+        rows = db.session.execute(
+            db.select(Flight.departure, Flight.destination, Flight.departure_time).where(Flight.id.in_(missing))
+        )
+        keys.update(search_route_key(*row) for row in rows)
+    return keys
+
+def invalidate_searches(route_keys):
+    for route in route_keys:
+        search_cache.invalidate(route)
+        route_graph.mark_stale(route)
+
+def flight_snapshot(flight):
+    # What flights.html needs; plain data so cached results never touch a session
+    return {
+        'id': flight.id,
+        'flight_number': flight.flight_number,
+        'airline': flight.airline,
+        'departure': flight.departure,
+        'destination': flight.destination,
+        'departure_time': flight.departure_time,
+        'arrival_time': flight.arrival_time,
+        'price': flight.price,
+        'available_seats': flight.available_seats
+    }
+
+class RouteGraph:
+    """Time-expanded graph of flight legs for connection search, loaded one day at a time.
+
+    A day's legs are indexed by route and sorted by departure, so the next
+    feasible leg out of a connecting airport is a bisect rather than a
+    self-join on flight. Seat changes and new flights (via invalidate_searches)
+    mark their route and day stale; only those routes are re-read before the
+    next search, and legs with no seats left drop out of the graph.
+    """
+
+    def __init__(self, max_days, ttl):
+        self.max_days = max_days
+        self.ttl = ttl
+        self.days = OrderedDict()  # date -> (loaded_at, {(departure, destination): (times, legs)})
+        self.stale = {}  # date -> routes to re-read
+        self.loaders = {}  # date -> lock held while that day is read from the database
+        self.lock = threading.Lock()  # Guards the dicts above; never held across a query
+
+    def _query_legs(self, travel_date, routes=None):
+        day_start = datetime.combine(travel_date, datetime.min.time())
+        query = db.select(Flight.id, Flight.flight_number, Flight.airline, Flight.departure, Flight.destination,
+                          Flight.departure_time, Flight.arrival_time, Flight.price, Flight.available_seats).where(
+            Flight.departure_time >= day_start,
+            Flight.departure_time < day_start + timedelta(days=1),
+            Flight.available_seats > 0
+        )
+        if routes is not None:
+            query = query.where(db.tuple_(Flight.departure, Flight.destination).in_(list(routes)))
+        legs = {}
+        # Always the primary: the graph is shared by every request for up to ROUTE_GRAPH_TTL, and a lagging
+        # replica would cache seat counts from before the write that marked the route stale
+        for row in db.session.execute(query.order_by(Flight.departure_time), bind_arguments={'bind': db.engine}):
+            legs.setdefault((row.departure, row.destination), []).append(flight_snapshot(row))
+        return {route: ([leg['departure_time'] for leg in route_legs], route_legs)
+                for route, route_legs in legs.items()}
+
+    def _current(self, travel_date):
+        # The day's index if it is loaded, unexpired and has nothing stale; call with self.lock held
+        entry = self.days.get(travel_date)
+        if entry is None or time.monotonic() - entry[0] > self.ttl or travel_date in self.stale:
+            return None
+        self.days.move_to_end(travel_date)
+        return entry[1]
+
+    def day(self, travel_date):
+        with self.lock:
+            index = self._current(travel_date)
+            if index is not None:
+                return index
+            loader = self.loaders.setdefault(travel_date, threading.Lock())
+
+        # One load per day at a time; other days and up-to-date reads don't wait on the query
+        with loader:
+            with self.lock:
+                index = self._current(travel_date)
+                if index is not None:
+                    return index
+                entry = self.days.get(travel_date)
+                full = entry is None or time.monotonic() - entry[0] > self.ttl
+                # Routes marked while the query runs land in a new stale set and are re-read next time
+                routes = self.stale.pop(travel_date, set())
+            loaded_at = time.monotonic()
+            try:
+                fresh = self._query_legs(travel_date, None if full else routes)
+            except Exception:
+                with self.lock:
+                    self.stale.setdefault(travel_date, set()).update(routes)
+                raise
+
+            with self.lock:
+                if full:
+                    entry = (loaded_at, fresh)
+                else:
+                    # Copy so searches still iterating the old index are unaffected
+                    index = {route: value for route, value in entry[1].items() if route not in routes}
+                    index.update(fresh)
+                    entry = (entry[0], index)
+                self.days[travel_date] = entry
+                self.days.move_to_end(travel_date)
+                while len(self.days) > self.max_days:
+                    dropped, _ = self.days.popitem(last=False)
+                    self.stale.pop(dropped, None)
+                    if dropped in self.loaders and not self.loaders[dropped].locked():
+                        del self.loaders[dropped]
+                return entry[1]
+
+    def mark_stale(self, route_key):
+        departure, destination, travel_date = route_key
+        with self.lock:
+            # Days being loaded for the first time count too: their query may predate this write
+            if travel_date in self.days or travel_date in self.loaders:
+                self.stale.setdefault(travel_date, set()).add((departure, destination))
+
+    def clear(self):
+        with self.lock:
+            self.days.clear()
+            self.stale.clear()
+            self.loaders = {day: loader for day, loader in self.loaders.items() if loader.locked()}
+
+    def itineraries(self, origin, destination, travel_date, passengers=1, max_stops=None,
+                    min_connection=None, max_duration=None, limit=20):
+        """Up to `limit` itineraries departing on travel_date, earliest arrival first.
+
+        For each first leg only the earliest onward connection through each
+        airport is considered, and first legs are tried in arrival order so
+        the search stops as soon as no remaining one can beat the current list.
+        """
+        max_stops = app.config['CONNECTION_MAX_STOPS'] if max_stops is None else max_stops
+        min_connection = min_connection or app.config['CONNECTION_MIN_TIME']
+        max_duration = max_duration or app.config['CONNECTION_MAX_DURATION']
+
+        # Legs can depart until the last first leg's departure plus max_duration
+        span = -(-(timedelta(days=1) + max_duration) // timedelta(days=1))
+        indexes = [self.day(travel_date + timedelta(days=n)) for n in range(span)]
+        day_start = datetime.combine(travel_date, datetime.min.time())
+        airports = {route[0] for index in indexes for route in index}
+
+        def next_leg(departure, arrival_airport, earliest, deadline):
+            # Earliest leg departing at or after `earliest` with room for the party, arriving by deadline
+            for index in indexes[(earliest.date() - travel_date).days:]:
+                times, legs = index.get((departure, arrival_airport), ((), ()))
+                for leg in itertools.islice(legs, bisect.bisect_left(times, earliest), None):
+                    if leg['departure_time'] > deadline:
+                        return None
+                    if leg['available_seats'] >= passengers and leg['arrival_time'] <= deadline:
+                        return leg
+            return None
+
+        # Best `limit` itineraries so far, as a max-heap on (arrival, leg count, price). Once it is full,
+        # its worst arrival bounds the search: nothing arriving later can make the list.
+        best = []
+        tiebreak = itertools.count()
+
+        def offer(legs):
+            entry = (-(legs[-1]['arrival_time'] - day_start).total_seconds(), -len(legs),
+                     -sum(leg['price'] for leg in legs), next(tiebreak), legs)
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+
+        firsts = sorted((leg for (departure, _), (_, legs) in indexes[0].items() if departure == origin
+                         for leg in legs if leg['available_seats'] >= passengers),
+                        key=lambda leg: leg['arrival_time'])
+        for first in firsts:
+            cutoff = day_start + timedelta(seconds=-best[0][0]) if len(best) == limit else None
+            if cutoff and first['arrival_time'] > cutoff:
+                break  # First legs are in arrival order; every later one arrives too late
+            stop = first['destination']
+            if stop == destination:
+                offer((first,))
+                continue
+            earliest = first['arrival_time'] + min_connection
+            deadline = first['departure_time'] + max_duration
+            if cutoff:
+                deadline = min(deadline, cutoff)
+            if earliest > deadline:
+                continue
+            if max_stops >= 1:
+                second = next_leg(stop, destination, earliest, deadline)
+                if second:
+                    offer((first, second))
+            if max_stops >= 2:
+                for via in airports - {origin, stop, destination}:
+                    second = next_leg(stop, via, earliest, deadline)
+                    third = second and next_leg(via, destination, second['arrival_time'] + min_connection,
+                                                deadline)
+                    if third:
+                        offer((first, second, third))
+
+        return [entry[-1] for entry in sorted(best, reverse=True)]
+
+route_graph = RouteGraph(app.config['ROUTE_GRAPH_DAYS'], app.config['ROUTE_GRAPH_TTL'])
+
+@event.listens_for(OrmSession, 'after_flush')
+def collect_new_flight_routes(orm_session, flush_context):
+    routes = orm_session.info.setdefault('new_flight_routes', set())
+    for obj in orm_session.new:
+        if isinstance(obj, Flight):
+            routes.add(search_route_key(obj.departure, obj.destination, obj.departure_time))
+
+@event.listens_for(OrmSession, 'after_commit')
+def invalidate_new_flight_routes(orm_session):
+    invalidate_searches(orm_session.info.pop('new_flight_routes', ()))
+
+@event.listens_for(OrmSession, 'after_rollback')
+def discard_new_flight_routes(orm_session):
+    orm_session.info.pop('new_flight_routes', None)
+
+class MemoryDraftStore:
+    def __init__(self, max_entries, ttl):
+        self.cache = LRUTTLCache(max_entries, ttl.total_seconds())
+
+    def create(self, data):
+        draft_id = secrets.token_urlsafe(16)
+        self.cache.set(draft_id, data)
+        return draft_id
+
+    def get(self, draft_id):
+        return self.cache.get(draft_id)
+
+    def delete(self, draft_id):
+        self.cache.pop(draft_id)
+
+class DatabaseDraftStore:
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @retry_on_db_lock
+    def create(self, data):
+        draft_id = secrets.token_urlsafe(16)
+        now = datetime.utcnow()
+        db.session.execute(db.delete(BookingDraft).where(BookingDraft.expires_at <= now))
+        db.session.add(BookingDraft(id=draft_id, payload=json.dumps(data), expires_at=now + self.ttl))
+        db.session.commit()
+        return draft_id
+
+    def get(self, draft_id):
+        draft = db.session.get(BookingDraft, draft_id)
+        if not draft or draft.expires_at <= datetime.utcnow():
+            return None
+        return json.loads(draft.payload)
+
+    @retry_on_db_lock
+    def delete(self, draft_id):
+        db.session.execute(db.delete(BookingDraft).where(BookingDraft.id == draft_id))
+        db.session.commit()
+
+def make_draft_store(backend):
+    if backend == 'memory':
+        return MemoryDraftStore(app.config['DRAFT_CACHE_SIZE'], app.config['DRAFT_TTL'])
+    if backend == 'database':
+        return DatabaseDraftStore(app.config['DRAFT_TTL'])
+    raise ValueError(f"Unknown DRAFT_STORE backend: {backend}")
+
+draft_store = make_draft_store(app.config['DRAFT_STORE'])
+
+def get_pending_booking():
+    # Draft referenced by the session cookie, if it exists and belongs to this user
+    draft_id = session.get('draft_id')
+    if not draft_id:
+        return None
+    draft = draft_store.get(draft_id)
+    if not draft or draft.get('user_id') != session.get('user_id'):
+        return None
+    return draft
+
+if app.config['PRELOAD_RENDERERS']:
+    preload_renderers()
+
+ticket_executor = ThreadPoolExecutor(max_workers=app.config['TICKET_RENDER_WORKERS'],
+                                     thread_name_prefix='ticket-render')
+tickets_rendering = set()
+tickets_rendering_lock = threading.Lock()
+
+def ticket_context(booking):
+    # Plain data for ticket_pdf.html, safe to hand to another thread or process
+    flight = booking.flight
+    boarding = boarding_details(booking)
+    return {
+        'booking': {
+            'pnr': booking.pnr,
+            'status': booking.status,
+            'version': booking.version,
+            'flight': {
+                'flight_number': flight.flight_number,
+                'airline': flight.airline,
+                'departure': flight.departure,
+                'destination': flight.destination,
+                'departure_time': flight.departure_time,
+                'arrival_time': flight.arrival_time
+            }
+        },
+        'passengers': [{
+            'first_name': p.first_name,
+            'last_name': p.last_name,
+            'age': p.age,
+            'gender': p.gender,
+            'seat_number': p.seat_number,
+            'boarding_group': details['group'],
+            'boarding_sequence': details['sequence']
+        } for p, details in zip(booking.passengers, boarding['passengers'])],
+        'gate': boarding['gate'],
+        'boarding_time': boarding['boarding_time'],
+        'duration': duration_filter(flight.arrival_time - flight.departure_time),
+        'total_price': booking.total_price
+    }
+
+def ticket_cache_path(pnr, version):
+    return os.path.join(app.config['TICKET_CACHE_DIR'], f"{pnr}-v{version}.pdf")
+
+def store_ticket_pdf(pnr, version, pdf):
+    cache_dir = app.config['TICKET_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    path = ticket_cache_path(pnr, version)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+    # Older versions of this ticket are never served again; a newer one may already be stored by a
+    # render that finished first, so only remove versions below this one
+    prefix = f"{pnr}-v"
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith('.pdf') and int(name[len(prefix):-4]) < version:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    evict_ticket_cache()
+    return path
+
+def evict_ticket_cache():
+    # download_ticket touches the files it serves, so mtime order is least recently used first
+    entries = []
+    with os.scandir(app.config['TICKET_CACHE_DIR']) as it:
+        for entry in it:
+            if entry.name.endswith('.pdf'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # Replaced or evicted by a concurrent render
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= app.config['TICKET_CACHE_MAX_BYTES']:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def render_ticket_job(pnr, version):
+    try:
+        with app.app_context():
+            booking = db.session.query(Booking).options(
+                db.joinedload(Booking.flight).joinedload(Flight.boarding),
+                db.joinedload(Booking.passengers)
+            ).filter_by(pnr=pnr).first()
+            # A newer version has its own job queued
+            if booking and booking.version == version and not os.path.exists(ticket_cache_path(pnr, version)):
+                store_ticket_pdf(pnr, version, render_ticket_pdf(ticket_context(booking)))
+    except Exception as e:
+        print(f"[ERROR] render_ticket_job {pnr}: {e}")
+    finally:
+        with tickets_rendering_lock:
+            tickets_rendering.discard((pnr, version))
+
+def schedule_ticket_render(booking):
+    # Pre-render off the request thread so downloads are served from the cache
+    key = (booking.pnr, booking.version)
+    with tickets_rendering_lock:
+        if key in tickets_rendering:
+            return
+        tickets_rendering.add(key)
+    ticket_executor.submit(render_ticket_job, *key)
+
+export_pool = None
+export_pool_lock = threading.Lock()
+
+def get_export_pool():
+    # Created on first export; spawn so workers don't inherit this process's threads and connections
+    global export_pool
+    with export_pool_lock:
+        if export_pool is None:
+            export_pool = ProcessPoolExecutor(max_workers=app.config['TICKET_EXPORT_WORKERS'],
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return export_pool
+
+def render_ticket_in_worker(context):
+    with app.app_context():
+        return render_ticket_pdf(context)
+
+class ZipStream:
+    """Write-only, non-seekable sink for ZipFile; the response generator drains it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_tickets_zip(contexts):
+    """Yield a ZIP of ticket PDFs, rendering cache misses across the export pool.
+
+    A ticket that fails to render is logged and left out rather than
+    cutting the archive short.
+    """
+    pool = get_export_pool()
+    window = app.config['TICKET_EXPORT_WINDOW']
+    stream = ZipStream()
+    pending = {}
+
+    def add_finished(futures):
+        for future in futures:
+            context = pending.pop(future)
+            pnr, version = context['booking']['pnr'], context['booking']['version']
+            try:
+                pdf = future.result()
+            except Exception as e:
+                app.logger.error(f"Ticket export skipped {pnr}: {e}")
+                continue
+            store_ticket_pdf(pnr, version, pdf)
+            archive.writestr(f"ticket_{pnr}.pdf", pdf)
+
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for context in contexts:
+            pnr, version = context['booking']['pnr'], context['booking']['version']
+            try:
+                with open(ticket_cache_path(pnr, version), 'rb') as f:
+                    archive.writestr(f"ticket_{pnr}.pdf", f.read())
+            except FileNotFoundError:
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    add_finished(done)
+                pending[pool.submit(render_ticket_in_worker, context)] = context
+            yield stream.drain()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            add_finished(done)
+            yield stream.drain()
+    yield stream.drain()
+
+MANIFEST_FIELDS = ['flight_number', 'departure', 'destination', 'departure_time', 'pnr', 'status',
+                   'last_name', 'first_name', 'seat_number', 'passport']
+
+def manifest_rows(*criteria, batch_size=1000):
+    """Yield a manifest row per passenger on the flights matching `criteria` (Flight filters).
+
+    One query: flight -> booking -> passenger over the flight_id and
+    booking_id indexes, in flight, booking, passenger order, fetched
+    `batch_size` rows at a time from a server-side cursor.
+    """
+    result = db.session.execute(
+        db.select(Flight.flight_number, Flight.departure, Flight.destination, Flight.departure_time,
+                  Booking.pnr, Booking.status, Passenger.last_name, Passenger.first_name,
+                  Passenger.seat_number, Passenger.passport)
+        .join(Booking, Booking.flight_id == Flight.id)
+        .join(Passenger, Passenger.booking_id == Booking.id)
+        .where(*criteria)
+        .order_by(Flight.id, Booking.id, Passenger.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        row = row._asdict()
+        row['departure_time'] = row['departure_time'].isoformat()
+        yield row
+
+def manifest_chunks(rows, fmt='csv', chunk_bytes=65536):
+    """Encode manifest rows as CSV (with header) or JSONL, yielding ~chunk_bytes strings."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, MANIFEST_FIELDS) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + '\n')
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def manifest_criteria(flight_ids=(), travel_date=None, departure=None):
+    # Explicit flights, or every departure on a day (optionally from one airport)
+    criteria = []
+    if flight_ids:
+        criteria.append(Flight.id.in_(flight_ids))
+    if travel_date:
+        day_start = datetime.combine(travel_date, datetime.min.time())
+        criteria += [Flight.departure_time >= day_start, Flight.departure_time < day_start + timedelta(days=1)]
+    if departure:
+        criteria.append(Flight.departure == departure)
+    return criteria
 
 def init_db():
     with app.app_context():
@@ -116,35 +1865,188 @@ def init_db():
         db.create_all()
         add_sample_data()
 
+def schedule_routes(airports=AIRPORTS):
+    return [(departure, destination) for departure in airports for destination in airports
+            if departure != destination]
+
+def generate_schedule(routes, dates, flights_per_day, seed=0):
+    """Yield flight rows for every route on every date.
+
+    Each (route, date) gets its own RNG derived from the seed, so a day's
+    timetable is the same no matter when or in what order it is generated.
+    """
+    for travel_date in dates:
+        day_start = datetime.combine(travel_date, datetime.min.time())
+        for departure, destination in routes:
+            rng = random.Random(f"{seed}:{departure}-{destination}:{travel_date.isoformat()}")
+            for i in range(flights_per_day):
+                dep_time = day_start + timedelta(
+                    hours=6 + i * (16 // flights_per_day) + rng.randint(0, 2),
+                    minutes=rng.choice([0, 15, 30, 45])
+                )
+                yield {
+                    'flight_number': generate_flight_number(rng),
+                    'airline': rng.choice(AIRLINES),
+                    'departure': departure,
+                    'destination': destination,
+                    'departure_time': dep_time,
+                    'arrival_time': dep_time + timedelta(hours=rng.randint(1, 3), minutes=rng.randint(0, 59)),
+                    'price': generate_flight_price(rng),
+                    'total_seats': 180,
+                    'available_seats': 180
+                }
+
+def insert_flight_rows(rows, batch_size=5000):
+    """Insert flight dicts with executemany in batches (no ORM objects); caller commits."""
+    count = 0
+    routes = set()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        routes.add(search_route_key(row['departure'], row['destination'], row['departure_time']))
+        if len(batch) >= batch_size:
+            db.session.execute(Flight.__table__.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(Flight.__table__.insert(), batch)
+        count += len(batch)
+    # Core inserts skip the ORM flush hooks, so hand the routes to the commit hook directly
+    db.session.info.setdefault('new_flight_routes', set()).update(routes)
+    return count
+
+def schedule_row(record):
+    # One timetable leg from a CSV/JSONL record; a new flight is always unsold
+    total_seats = int(record.get('total_seats') or 180)
+    return {
+        'flight_number': record['flight_number'],
+        'airline': record['airline'],
+        'departure': airport_code(record['departure']),
+        'destination': airport_code(record['destination']),
+        'departure_time': datetime.fromisoformat(record['departure_time']),
+        'arrival_time': datetime.fromisoformat(record['arrival_time']),
+        'price': float(record['price']),
+        'total_seats': total_seats,
+        'available_seats': total_seats
+    }
+
+def read_schedule_file(path):
+    """Stream flight rows from a .csv (with header) or .jsonl timetable."""
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for line_number, record in enumerate(records, start=1):
+            try:
+                yield schedule_row(record)
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{path}: record {line_number} is invalid ({e!r})") from e
+
+def bulk_load_flights(rows, batch_size=10000, transaction_rows=250000, progress=None):
+    """Insert a stream of flight rows with executemany, committing every `transaction_rows` rows.
+
+    Memory stays at one batch regardless of input size. `progress(count, seconds)`
+    is called after each commit. Returns (count, seconds).
+    """
+    started = time.perf_counter()
+    count = 0
+    rows = iter(rows)
+    while True:
+        count_in_transaction = insert_flight_rows(itertools.islice(rows, transaction_rows), batch_size)
+        if not count_in_transaction:
+            break
+        db.session.commit()
+        count += count_in_transaction
+        if progress:
+            progress(count, time.perf_counter() - started)
+    return count, time.perf_counter() - started
+
+def reprice_flights(now=None, batch_size=50000, progress=None):
+    """Recompute the fare of every flight that has not departed yet, one committed batch at a time.
+
+    Fares come from pricing.reprice_batch (NumPy over the whole batch) and only
+    changed ones are written back, with a single executemany per batch. Each
+    batch also bumps the ticket version of bookings priced at the flight's
+    current fare (fare IS NULL) and invalidates the searches on its routes.
+    `progress(checked, changed, seconds)` is called after each batch.
+    Returns (checked, changed, seconds).
+    """
+    from pricing import reprice_batch  # NumPy is only needed by the repricing job
+
+    started = time.perf_counter()
+    now = now or datetime.now()
+    flights = Flight.__table__
+    update = flights.update().where(flights.c.id == db.bindparam('flight_id')).values(price=db.bindparam('fare'))
+    bookings = Booking.__table__
+    # Their tickets show the flight's price, so cached PDFs go stale with it
+    bump_versions = bookings.update().where(
+        bookings.c.flight_id == db.bindparam('repriced_id'), bookings.c.fare.is_(None)
+    ).values(version=bookings.c.version + 1)
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(flights.c.id, flights.c.base_price, flights.c.price, flights.c.available_seats,
+                      flights.c.total_seats, flights.c.departure_time, flights.c.departure, flights.c.destination)
+            .where(flights.c.id > last_id, flights.c.departure_time > now)
+            .order_by(flights.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        fares = reprice_batch([row[:6] for row in rows], now,
+                              app.config['PRICING_LOAD_CURVE'], app.config['PRICING_DAYS_CURVE'])
+        routes = set()
+        if fares:
+            db.session.execute(update, fares)
+            repriced = {fare['flight_id'] for fare in fares}
+            legacy = db.session.scalars(
+                db.select(bookings.c.flight_id).distinct()
+                .where(bookings.c.flight_id.between(rows[0].id, rows[-1].id), bookings.c.fare.is_(None))
+            ).all()
+            bumps = [{'repriced_id': flight_id} for flight_id in legacy if flight_id in repriced]
+            if bumps:
+                db.session.execute(bump_versions, bumps)
+            routes = {search_route_key(row.departure, row.destination, row.departure_time)
+                      for row in rows if row.id in repriced}
+        db.session.commit()  # Short transactions so bookings get the write lock between batches
+        invalidate_searches(routes)
+        checked += len(rows)
+        changed += len(fares)
+        last_id = rows[-1].id
+        if progress:
+            progress(checked, changed, time.perf_counter() - started)
+    return checked, changed, time.perf_counter() - started
+
+@retry_on_db_lock
+def extend_schedule(start_date, days, routes=None, flights_per_day=None, seed=None):
+    """Generate the timetable for every date in the window not loaded yet. One transaction per day."""
+    routes = routes or schedule_routes()
+    flights_per_day = flights_per_day or app.config['SCHEDULE_FLIGHTS_PER_DAY']
+    seed = app.config['SCHEDULE_SEED'] if seed is None else seed
+
+    dates = [start_date + timedelta(days=n) for n in range(days)]
+    loaded = set(db.session.scalars(
+        db.select(ScheduleDay.date).where(ScheduleDay.date.between(dates[0], dates[-1]))
+    ))
+    total = 0
+    for travel_date in dates:
+        if travel_date in loaded:
+            continue
+        count = insert_flight_rows(generate_schedule(routes, [travel_date], flights_per_day, seed))
+        db.session.add(ScheduleDay(date=travel_date, flights=count))
+        db.session.commit()
+        total += count
+    return total
+
 def add_sample_data():
-    cities = ['DEL', 'BOM', 'BLR', 'HYD', 'MAA', 'CCU', 'JFK', 'LAX', 'ORD', 'LHR']
-    airlines = ['AirIndia', 'United', 'Delta', 'American', 'British Airways']
-    
-    # Add sample flights for next 30 days
-    for _ in range(50):
-        departure, destination = random.sample(cities, 2)
-        dep_time = datetime.now() + timedelta(
-            days=random.randint(1, 30),
-            hours=random.randint(0, 23),
-            minutes=random.choice([0, 15, 30, 45])
-        )
-        duration = timedelta(hours=random.randint(1, 6), minutes=random.randint(0, 59))
-        
-        flight = Flight(
-            flight_number=generate_flight_number(),
-            airline=random.choice(airlines),
-            departure=departure,
-            destination=destination,
-            departure_time=dep_time,
-            arrival_time=dep_time + duration,
-            price=generate_flight_price(),
-            available_seats=random.randint(5, 180)
-        )
-        db.session.add(flight)
+    # Timetable for the next SAMPLE_SCHEDULE_DAYS days across every route in the search form
+    extend_schedule(datetime.now().date() + timedelta(days=1), app.config['SAMPLE_SCHEDULE_DAYS'])
     
     # Add test user only if it doesn't exist
     if not User.query.filter_by(email='test@example.com').first():
-        hashed_password = generate_password_hash('test123', method='scrypt')  # Updated method
+        hashed_password = generate_password_hash('test123', method=app.config['PASSWORD_HASH_METHOD'])
         test_user = User(
             username='testuser',
             email='test@example.com',
@@ -155,6 +2057,107 @@ def add_sample_data():
     db.session.commit()
 
 # Routes
+@app.cli.command('extend-schedule')
+@click.option('--days', default=30, help='Days to cover, starting tomorrow.')
+@click.option('--seed', default=None, type=int, help='Schedule seed (defaults to SCHEDULE_SEED).')
+def extend_schedule_command(days, seed):
+    """Generate flights for any day in the horizon that has no timetable yet."""
+    db.create_all()
+    started = time.perf_counter()
+    # Start tomorrow like add_sample_data: today's departures may already have left
+    count = extend_schedule(datetime.now().date() + timedelta(days=1), days, seed=seed)
+    click.echo(f"Added {count} flights in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command('rebuild-seat-maps')
+def rebuild_seat_maps_command():
+    """Mark the seats passengers already hold in each flight's seat map (after upgrading an existing database)."""
+    seats = {}
+    invalid = []
+    for flight_id, pnr, seat in db.session.execute(
+            db.select(Booking.flight_id, Booking.pnr, Passenger.seat_number).join(Booking.passengers)
+            .where(Passenger.seat_number.is_not(None))):
+        if is_valid_seat(seat):
+            seats.setdefault(flight_id, []).append(seat)
+        else:
+            invalid.append((pnr, seat))  # Older save_seats accepted any string; it holds no place in the cabin
+    if seats:
+        db.session.execute(db.update(Flight), [
+            {'id': flight_id, 'seat_map': seat_mask(taken).to_bytes(SEAT_MAP_BYTES, 'big')}
+            for flight_id, taken in seats.items()])
+    db.session.commit()
+    click.echo(f"Rebuilt seat maps for {len(seats):,} flights")
+    if invalid:
+        click.echo(f"Skipped {len(invalid):,} seat numbers outside the {SEAT_ROWS[0]}1-{SEAT_ROWS[-1]}{SEATS_PER_ROW} grid:")
+        for pnr, seat in invalid[:20]:
+            click.echo(f"  {pnr}: {seat!r}")
+        if len(invalid) > 20:
+            click.echo(f"  ... and {len(invalid) - 20:,} more")
+
+@app.cli.command('reprice')
+@click.option('--batch-size', default=50000, help='Flights per batch (one commit each).')
+def reprice_command(batch_size):
+    """Recompute fares from load factor and days to departure (run from cron)."""
+    checked, changed, seconds = reprice_flights(batch_size=batch_size)
+    click.echo(f"Repriced {changed:,} of {checked:,} flights in {seconds:.1f}s")
+
+@app.cli.command('auto-seat')
+@click.option('--date', 'travel_date', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Seat every flight departing on this day.')
+@click.option('--flight-id', type=int, help='Seat a single flight.')
+def auto_seat_command(travel_date, flight_id):
+    """Give every passenger without a seat one next to their party (close of check-in)."""
+    if flight_id is not None:
+        criteria = [Flight.id == flight_id]
+    elif travel_date is not None:
+        criteria = [Flight.departure_time >= travel_date, Flight.departure_time < travel_date + timedelta(days=1)]
+    else:
+        raise click.UsageError('Pass --date or --flight-id.')
+
+    def progress(flights, seated, seconds):
+        click.echo(f"{flights:,} flights, {seated:,} passengers seated")
+
+    flights, seated, unseated, seconds = auto_seat_flights(*criteria, progress=progress)
+    click.echo(f"Seated {seated:,} passengers on {flights:,} flights in {seconds:.1f}s"
+               + (f" ({unseated:,} left without a seat: cabin full)" if unseated else ''))
+
+@app.cli.command('open-checkin')
+def open_checkin_command():
+    """Prepare gate and boarding data for flights departing within CHECKIN_OPENS (run from cron)."""
+    db.create_all()
+    now = datetime.now()
+    started = time.perf_counter()
+    opened = open_checkin(Flight.departure_time > now, Flight.departure_time <= now + app.config['CHECKIN_OPENS'])
+    click.echo(f"Opened check-in for {opened:,} flights in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command('manifest')
+@click.option('--flight-id', 'flight_ids', type=int, multiple=True, help='Flight to include (repeatable).')
+@click.option('--date', 'travel_date', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Every flight departing on this day.')
+@click.option('--departure', default=None, help='Only flights from this airport (with --date).')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--output', type=click.File('w'), default='-', help='File to write (default: stdout).')
+def manifest_command(flight_ids, travel_date, departure, fmt, output):
+    """Stream the passenger manifest of one or many flights as CSV or JSONL."""
+    if not flight_ids and travel_date is None:
+        raise click.UsageError('Pass --flight-id or --date.')
+    criteria = manifest_criteria(flight_ids, travel_date and travel_date.date(), departure and airport_code(departure))
+    for chunk in manifest_chunks(manifest_rows(*criteria), fmt):
+        output.write(chunk)
+
+@app.cli.command('load-schedule')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=10000, help='Rows per executemany call.')
+@click.option('--transaction-rows', default=250000, help='Rows per commit.')
+def load_schedule_command(path, batch_size, transaction_rows):
+    """Bulk import flights from a CSV or JSONL timetable."""
+    db.create_all()
+
+    def progress(count, seconds):
+        click.echo(f"{count:,} flights, {count / seconds:,.0f} rows/s")
+
+    count, seconds = bulk_load_flights(read_schedule_file(path), batch_size, transaction_rows, progress)
+    click.echo(f"Loaded {count:,} flights in {seconds:.1f}s ({count / max(seconds, 1e-9):,.0f} rows/s)")
+
 @app.route('/')
 def home():
     return render_template('home.html')
@@ -178,8 +2181,11 @@ def signup():
             flash('Email already registered', 'error')
             return redirect(url_for('signup'))
         
-        # Use 'pbkdf2:sha256' instead of just 'sha256'
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except PasswordHashingBusy:
+            flash('Too many requests right now, please try again in a moment', 'error')
+            return render_template('signup.html'), 503
         new_user = User(username=username, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -193,13 +2199,31 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        
+
+        # Throttle before any hashing work; both buckets are charged for every attempt
+        ip_allowed = login_ip_limiter.allow(request.remote_addr)
+        if not (login_username_limiter.allow(username.lower()) and ip_allowed):
+            flash('Too many login attempts, please try again later', 'error')
+            return render_template('login.html'), 429
+
         user = User.query.filter_by(username=username).first()
-        
-        if not user or not check_password_hash(user.password, password):
+
+        try:
+            verified = password_hasher.verify(user.password if user else None, password)
+            if verified and password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.rehash(password)
+                db.session.commit()
+        except PasswordHashingBusy:
+            flash('Too many requests right now, please try again in a moment', 'error')
+            return render_template('login.html'), 503
+
+        if not verified:
             flash('Invalid username or password', 'error')
             return redirect(url_for('login'))
-        
+
+        # Only failed attempts count against the limits, so an office behind one IP can keep signing in
+        login_username_limiter.reset(username.lower())
+        login_ip_limiter.refund(request.remote_addr)
         session['user_id'] = user.id
         session['username'] = user.username
         flash('Logged in successfully!', 'success')
@@ -216,11 +2240,12 @@ def logout():
 
 @app.route('/search-flights', methods=['GET', 'POST'])
 @login_required
+@query_budget(1)
 def search_flights():
     if request.method == 'POST':
         try:
-            departure = request.form.get('departure')
-            destination = request.form.get('destination')
+            departure = airport_code(request.form.get('departure'))
+            destination = airport_code(request.form.get('destination'))
             travel_date = request.form.get('travel_date')
             passengers = int(request.form.get('passengers', 1))
             
@@ -238,41 +2263,29 @@ def search_flights():
                 flash('Please select today or a future date', 'error')
                 return redirect(url_for('home'))
             
-            # Search for flights in database
-            flights = Flight.query.filter(
-                Flight.departure == departure,
-                Flight.destination == destination,
-                db.func.date(Flight.departure_time) == date_obj,
-                Flight.available_seats >= passengers
-            ).order_by(Flight.departure_time).all()
+            # Search for flights, served from the route cache when possible
+            started = time.perf_counter()
+            cache_key = (departure, destination, date_obj, passengers)
+            flights = search_cache.get(cache_key)
+            if flights is None:
+                generation = search_cache.generation(cache_key)
+                # Always the primary: the result is shared until invalidated, and a lagging replica could
+                # hand back seat counts from before the booking that just invalidated this route
+                flights = [flight_snapshot(flight) for flight in db.session.scalars(
+                    db.select(Flight).where(*flight_search_criteria(departure, destination, date_obj, passengers))
+                    .order_by(Flight.departure_time),
+                    bind_arguments={'bind': db.engine}
+                )]
+                search_cache.set(cache_key, flights, generation)
+                search_cache.record(False, time.perf_counter() - started)
+            else:
+                search_cache.record(True, time.perf_counter() - started)
         
-            # If no flights found, generate 3 sample flights
-            if not flights:
-                flights = []
-                for i in range(3):
-                    dep_time = datetime.combine(
-                        date_obj,
-                        datetime.strptime(f"{6+i*6}:00", "%H:%M").time()
-                    )
-                    duration = timedelta(hours=random.randint(1,3))
-                    
-                    flight = Flight(
-                        flight_number=generate_flight_number(),
-                        airline=random.choice(['AirIndia', 'United', 'Delta']),
-                        departure=departure,
-                        destination=destination,
-                        departure_time=dep_time,
-                        arrival_time=dep_time + duration,
-                        price=generate_flight_price(),
-                        available_seats=random.randint(5,50)
-                    )
-                    db.session.add(flight)
-                    flights.append(flight)
-                db.session.commit()
-            
             return render_template('flights.html', 
                                 flights=flights, 
-                                passengers=passengers)
+                                passengers=passengers,
+                                search={'departure': departure, 'destination': destination,
+                                        'travel_date': travel_date, 'passengers': passengers})
         
         except ValueError as e:
             flash('Invalid date format', 'error')
@@ -283,6 +2296,56 @@ def search_flights():
     
     return redirect(url_for('home'))
 
+@app.route('/search-connections')
+@login_required
+def search_connections():
+    try:
+        departure = airport_code(request.args.get('departure'))
+        destination = airport_code(request.args.get('destination'))
+        travel_date = datetime.strptime(request.args.get('travel_date', ''), '%Y-%m-%d').date()
+        passengers = int(request.args.get('passengers', 1))
+    except ValueError:
+        flash('Invalid date format', 'error')
+        return redirect(url_for('home'))
+
+    if not departure or not destination or departure == destination or passengers <= 0:
+        flash('Please choose two different airports', 'error')
+        return redirect(url_for('home'))
+    if travel_date < datetime.now().date():
+        flash('Please select today or a future date', 'error')
+        return redirect(url_for('home'))
+
+    try:
+        itineraries = route_graph.itineraries(departure, destination, travel_date, passengers)
+    except SQLAlchemyError as e:
+        print(f"[ERROR] search_connections: {e}")
+        flash('An error occurred while searching for flights', 'error')
+        return redirect(url_for('home'))
+
+    return render_template('connections.html', itineraries=itineraries, passengers=passengers,
+                           departure=departure, destination=destination, travel_date=travel_date)
+
+@app.route('/fare-calendar')
+@login_required
+@read_replica
+@query_budget(1)
+def fare_calendar():
+    try:
+        departure = airport_code(request.args.get('departure'))
+        destination = airport_code(request.args.get('destination'))
+        travel_date = datetime.strptime(request.args.get('travel_date', ''), '%Y-%m-%d').date()
+        days = int(request.args.get('days', 3))
+        passengers = int(request.args.get('passengers', 1))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date or number'}), 400
+    if not departure or not destination or departure == destination:
+        return jsonify({'success': False, 'error': 'Choose two different airports'}), 400
+
+    start_date, end_date = fare_calendar_window(travel_date, days)
+    rows = db.session.execute(fare_calendar_query(departure, destination, start_date, end_date, passengers))
+    return jsonify({'success': True, 'departure': departure, 'destination': destination,
+                    'days': fare_calendar_days(rows, start_date, end_date)})
+
 @app.route('/book-flight/<int:flight_id>')
 @login_required
 def book_flight(flight_id):
@@ -337,11 +2400,24 @@ def process_booking():
                 'passport': passport if passport else None
             })
 
-        session['pending_booking'] = {
-            'flight_id': flight_id,
+        # Give back seats from an earlier, abandoned checkout before holding new ones
+        previous = get_pending_booking()
+        if previous:
+            if previous.get('hold_id'):
+                release_seat_hold(previous['hold_id'])
+            draft_store.delete(session.pop('draft_id'))
+
+        hold = place_seat_hold(session['user_id'], flight.id, num_passengers)
+        if not hold:
+            return render_template('passenger_details.html', error='Not enough seats available', flight=flight)
+
+        session['draft_id'] = draft_store.create({
+            'user_id': session['user_id'],
+            'flight_id': flight.id,
             'num_passengers': num_passengers,
-            'passengers': passengers
-        }
+            'passengers': passengers,
+            'hold_id': hold.id
+        })
 
         return redirect(url_for('payment'))
 
@@ -352,24 +2428,28 @@ def process_booking():
 @app.route('/payment')
 @login_required
 def payment():
-    if 'pending_booking' not in session:
+    booking_data = get_pending_booking()
+    if not booking_data:
         return render_template('passenger_details.html', error='No booking data found', flight=None)
 
     try:
-        booking_data = session['pending_booking']
         flight = Flight.query.get(booking_data['flight_id'])
 
         if not flight:
             return render_template('passenger_details.html', error='Flight not found', flight=None)
 
+        hold = db.session.get(SeatHold, booking_data['hold_id']) if booking_data.get('hold_id') else None
+        # complete_booking charges the hold's quote while the hold is live, otherwise the current fare
+        quoted = hold and hold.status == 'Active' and hold.expires_at > datetime.utcnow() and hold.fare is not None
         temp_booking = {
             'flight': flight,
-            'pnr': generate_pnr(),
-            'total_price': flight.price * booking_data['num_passengers'],
+            'pnr': None,  # Assigned when the booking is confirmed
+            'total_price': (hold.fare if quoted else flight.price) * booking_data['num_passengers'],
             'passengers': booking_data['passengers']
         }
 
-        return render_template('payment.html', booking=temp_booking, flight=flight, total_price=temp_booking['total_price'])
+        return render_template('payment.html', booking=temp_booking, flight=flight, total_price=temp_booking['total_price'],
+                               hold=hold)
 
     except Exception as e:
         print(f"[ERROR] payment: {e}")
@@ -378,45 +2458,29 @@ def payment():
 @app.route('/complete-booking', methods=['POST'])
 @login_required
 def complete_booking():
-    if 'pending_booking' not in session:
+    booking_data = get_pending_booking()
+    if not booking_data:
         flash('No booking to complete', 'error')
         return redirect(url_for('payment'))
 
     try:
-        booking_data = session['pending_booking']
         flight = db.session.get(Flight, booking_data['flight_id'])  # Updated to session.get()
         
         if not flight:
             flash('Flight not found', 'error')
             return redirect(url_for('payment'))
 
-        # Create the booking
-        booking = Booking(
-            user_id=session['user_id'],
-            flight_id=flight.id,
-            passenger_count=booking_data['num_passengers'],  # Use passenger_count
-            pnr=generate_pnr(),
-            status='Confirmed'
-        )
-
-        db.session.add(booking)
-        db.session.flush()
-
-        # Add passengers
-        for passenger_data in booking_data['passengers']:
-            passenger = Passenger(
-                booking_id=booking.id,
-                first_name=passenger_data['first_name'],
-                last_name=passenger_data['last_name'],
-                age=passenger_data['age'],
-                gender=passenger_data['gender'],
-                passport=passenger_data.get('passport')
-            )
-            db.session.add(passenger)
-
-        flight.available_seats -= booking_data['num_passengers']
-        db.session.commit()
-        session.pop('pending_booking', None)
+        booking = create_booking(session['user_id'], dict(booking_data, flight_id=flight.id))
+        if not booking:
+            flash('Not enough seats available', 'error')
+            return redirect(url_for('payment'))
+        # The booking is committed; a draft left behind expires with DRAFT_TTL
+        try:
+            draft_store.delete(session.pop('draft_id'))
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app.logger.error(f"Could not delete booking draft after confirming {booking.pnr}: {e}")
+        schedule_ticket_render(booking)
 
         # FIX APPLIED HERE: Redirect instead of render
         return redirect(url_for('view_ticket', pnr=booking.pnr))
@@ -427,12 +2491,53 @@ def complete_booking():
         flash('Failed to complete booking', 'error')
         return redirect(url_for('payment'))
 
+@app.route('/metrics')
+@ops_required
+def metrics():
+    with hold_metrics_lock:
+        hold_snapshot = dict(hold_metrics)
+    return jsonify({
+        'seat_holds': dict(hold_snapshot, active=SeatHold.query.filter_by(status='Active').count()),
+        'rendering': render_stats(),
+        'search_cache': search_cache.metrics(),
+        'auth': dict(password_hasher.metrics(), throttled_usernames=login_username_limiter.rejected,
+                     throttled_ips=login_ip_limiter.rejected),
+        'queries': query_metrics
+    })
+
+@app.route('/my-bookings')
+@login_required
+@read_replica
+@query_budget(2)
+def my_bookings():
+    # ?cursor=<last booking of the previous page>; flights come in one selectin query per page
+    page_size = app.config['BOOKING_HISTORY_PAGE_SIZE']
+    try:
+        criteria = booking_history_criteria(session['user_id'], request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('my_bookings'))
+
+    bookings = db.session.query(Booking).options(
+        db.selectinload(Booking.flight)
+    ).filter(*criteria).order_by(booking_history_date.desc(), Booking.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(bookings) > page_size:
+        bookings = bookings[:page_size]
+        next_cursor = booking_history_cursor(bookings[-1].booking_date, bookings[-1].id)
+    return render_template('my_bookings.html',
+                           bookings=bookings,
+                           next_cursor=next_cursor,
+                           first_page=not request.args.get('cursor'))
+
 @app.route('/ticket/<pnr>')
 @login_required
+@read_replica
+@query_budget(1)
 def view_ticket(pnr):
     try:
         booking = db.session.query(Booking).options(
-            db.joinedload(Booking.flight),
+            db.joinedload(Booking.flight).joinedload(Flight.boarding),
             db.joinedload(Booking.passengers)
         ).filter_by(pnr=pnr).first()
 
@@ -441,12 +2546,13 @@ def view_ticket(pnr):
             return redirect(url_for('my_bookings'))
 
         duration = booking.flight.arrival_time - booking.flight.departure_time
-        total_price = booking.flight.price * booking.passenger_count  # Use passenger_count
+        total_price = booking.total_price
 
         return render_template('ticket.html',
                             booking=booking,
                             flight=booking.flight,
                             passengers=booking.passengers,
+                            boarding=boarding_details(booking),
                             duration=duration_filter(duration),
                             total_price=total_price)
 
@@ -457,46 +2563,93 @@ def view_ticket(pnr):
 
 @app.route('/ticket/<pnr>/download')
 @login_required
+@read_replica
+@query_budget(1)
 def download_ticket(pnr):
-    booking = db.session.query(Booking).filter_by(pnr=pnr).first()
+    booking = db.session.query(Booking).options(
+        db.joinedload(Booking.flight).joinedload(Flight.boarding),
+        db.joinedload(Booking.passengers)
+    ).filter_by(pnr=pnr).first()
     if not booking or booking.user_id != session['user_id']:
         flash('Unauthorized access or ticket not found', 'error')
         return redirect(url_for('my_bookings'))
 
-    passengers = Passenger.query.filter_by(booking_id=booking.id).all()
-    duration = booking.flight.arrival_time - booking.flight.departure_time
-    total_price = booking.flight.price * booking.passenger_count  # Changed to passenger_count
-
-    # Generate QR code
-    import qrcode
-    import base64
-    from io import BytesIO
-
-    qr_data = f"PNR:{booking.pnr}"
-    qr_img = qrcode.make(qr_data)
-    qr_buffer = BytesIO()
-    qr_img.save(qr_buffer, format="PNG")
-    qr_base64 = base64.b64encode(qr_buffer.getvalue()).decode('utf-8')
-
-    rendered = render_template('ticket_pdf.html',
-                               booking=booking,
-                               passengers=passengers,
-                               duration=duration_filter(duration),
-                               total_price=total_price,
-                               qr_code=qr_base64)
-
-    from xhtml2pdf import pisa
-    pdf = BytesIO()
-    pisa_status = pisa.CreatePDF(rendered, dest=pdf)
-
-    if pisa_status.err:
-        return "PDF generation error", 500
+    path = ticket_cache_path(booking.pnr, booking.version)
+    try:
+        os.utime(path)  # Mark as recently used for eviction
+        return send_file(path, download_name=f"ticket_{pnr}.pdf", as_attachment=True)
+    except FileNotFoundError:
+        pass
 
-    pdf.seek(0)
-    return send_file(pdf, download_name=f"ticket_{pnr}.pdf", as_attachment=True)
+    try:
+        pdf = render_ticket_pdf(ticket_context(booking))
+    except RuntimeError:
+        return "PDF generation error", 500
+    store_ticket_pdf(booking.pnr, booking.version, pdf)
+    # Sent from memory: another request's eviction may remove the cached file at any time
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', download_name=f"ticket_{pnr}.pdf",
+                     as_attachment=True)
+
+@app.route('/tickets/export', methods=['POST'])
+@ops_required
+def export_tickets():
+    data = request.get_json(silent=True) or request.form
+    query = db.select(Booking).options(
+        db.joinedload(Booking.flight).joinedload(Flight.boarding),
+        db.selectinload(Booking.passengers)
+    )
+    try:
+        flight_id = int(data['flight_id']) if data.get('flight_id') else None
+        user_id = int(data['user_id']) if data.get('user_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid flight_id or user_id'}), 400
+    if flight_id is not None:
+        query = query.where(Booking.flight_id == flight_id)
+    elif user_id is not None:
+        query = query.where(Booking.user_id == user_id)
+    elif data.get('pnrs'):
+        pnrs = data['pnrs'] if isinstance(data['pnrs'], list) else data['pnrs'].split(',')
+        query = query.where(Booking.pnr.in_([pnr.strip().upper() for pnr in pnrs]))
+    else:
+        return jsonify({'success': False, 'error': 'flight_id, user_id or pnrs is required'}), 400
+
+    # Stream bookings in batches and build each ticket context only when the ZIP reaches it
+    bookings = db.session.scalars(query.order_by(Booking.id)
+                                  .execution_options(yield_per=app.config['TICKET_EXPORT_BATCH']))
+    first = next(bookings, None)
+    if first is None:
+        return jsonify({'success': False, 'error': 'No bookings found'}), 404
+
+    contexts = (ticket_context(booking) for booking in itertools.chain([first], bookings))
+    return Response(stream_with_context(export_tickets_zip(contexts)),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=tickets.zip'})
+
+@app.route('/manifest')
+@ops_required
+def manifest():
+    # ?flight_id=12&flight_id=13 (or 12,13), or ?date=2030-01-01[&departure=DEL]; &format=csv|jsonl
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'error': 'format must be csv or jsonl'}), 400
+    try:
+        flight_ids = [int(flight_id) for value in request.args.getlist('flight_id')
+                      for flight_id in value.split(',') if flight_id.strip()]
+        travel_date = (datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+                       if request.args.get('date') else None)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid flight_id or date'}), 400
+    if not flight_ids and not travel_date:
+        return jsonify({'success': False, 'error': 'flight_id or date is required'}), 400
+
+    criteria = manifest_criteria(flight_ids, travel_date, airport_code(request.args.get('departure')) or None)
+    return Response(stream_with_context(manifest_chunks(manifest_rows(*criteria), fmt)),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename=manifest.{fmt}'})
 
 @app.route('/checkin/<pnr>', methods=['GET', 'POST'])
 @login_required
+@query_budget(9)  # 6, plus a savepoint and insert when this check-in opens the flight
 def checkin(pnr):
     # Get booking with flight and passenger data
     booking = db.session.query(Booking).options(
@@ -506,13 +2659,17 @@ def checkin(pnr):
     
     if not booking or booking.user_id != session['user_id']:
         flash("Unauthorized access or booking not found", "error")
-        return redirect(url_for('index'))
+        return redirect(url_for('my_bookings'))
 
     if request.method == 'POST':
         try:
             # Update booking status to Checked-In
-            booking.status = 'Checked-In'
-            db.session.commit()
+            if booking.status != 'Checked-In':
+                booking.status = 'Checked-In'
+                booking.version += 1
+                assign_boarding_sequence(booking)
+                db.session.commit()
+                schedule_ticket_render(booking)
             
             # Redirect to seats page after successful check-in
             return redirect(url_for('select_seats', pnr=pnr))
@@ -529,6 +2686,7 @@ def checkin(pnr):
 
 # ====== NEW CHECK-IN ROUTES ======
 @app.route('/verify-checkin', methods=['POST'])
+@query_budget(1)
 def verify_checkin():
     pnr = request.form.get('pnr', '').upper().strip()
     last_name = request.form.get('last_name', '').strip()
@@ -556,16 +2714,20 @@ def verify_checkin():
 
 @app.route('/select-seats/<pnr>')
 @login_required
+@read_replica
+@query_budget(1)
 def select_seats(pnr):
     booking = db.session.query(Booking).options(
+        db.joinedload(Booking.flight),
         db.joinedload(Booking.passengers)
     ).filter_by(pnr=pnr).first()
     
     if not booking or booking.user_id != session['user_id']:
         flash("Invalid booking reference", "error")
-        return redirect(url_for('index'))
+        return redirect(url_for('my_bookings'))
     
-    reserved_seats = [p.seat_number for p in booking.passengers if p.seat_number]
+    # Every taken seat on the flight, straight from the occupancy bitmap
+    reserved_seats = occupied_seats(booking.flight.seat_map)
     
     return render_template('seats.html',
                         booking=booking,
@@ -573,22 +2735,30 @@ def select_seats(pnr):
                         reserved_seats=reserved_seats)
 
 @app.route('/save-seats', methods=['POST'])
+@query_budget(6)
 def save_seats():
     try:
         data = request.get_json()
         pnr = data['pnr']
         seats = data['seats']
         
-        booking = Booking.query.filter_by(pnr=pnr).first()
+        booking = db.session.query(Booking).options(
+            db.joinedload(Booking.passengers)
+        ).filter_by(pnr=pnr).first()
         if not booking:
             return jsonify({'success': False, 'error': 'Booking not found'})
         
-        # Assign seats to passengers
-        for i, passenger in enumerate(booking.passengers):
-            if i < len(seats):
-                passenger.seat_number = seats[i]
+        if len(seats) > booking.passenger_count or len(set(seats)) != len(seats):
+            return jsonify({'success': False, 'error': 'Invalid seat selection'})
         
-        db.session.commit()
+        try:
+            seat_mask(seats)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+        
+        if not assign_seats(booking, seats):
+            return jsonify({'success': False, 'error': 'One or more selected seats are already taken'})
+        schedule_ticket_render(booking)
         
         return jsonify({
             'success': True,
@@ -600,29 +2770,34 @@ def save_seats():
 
 @app.route('/boarding-pass/<pnr>')
 @login_required
+@read_replica
+@query_budget(1)
 def boarding_pass(pnr):
     booking = db.session.query(Booking).options(
-        db.joinedload(Booking.flight),
+        db.joinedload(Booking.flight).joinedload(Flight.boarding),
         db.joinedload(Booking.passengers)  # This ensures passengers are loaded
     ).filter_by(pnr=pnr).first()
 
     if not booking or booking.user_id != session['user_id']:
         flash("Invalid booking reference", "error")
-        return redirect(url_for('index'))
-
-    # Calculate flight duration
-    duration = booking.flight.arrival_time - booking.flight.departure_time
-    hours, remainder = divmod(duration.seconds, 3600)
-    minutes = remainder // 60
-    duration_str = f"{hours}h {minutes}m"
-
-    # Generate random gate number
-    gate = f"{random.choice(['A', 'B', 'C'])}{random.randint(1, 30)}"
+        return redirect(url_for('my_bookings'))
 
-    return render_template('boarding_pass.html',
-                         booking=booking,
-                         duration=duration_str,
-                         gate=gate)
+    # Same page until the booking or its flight's boarding data changes: phones refreshing get a 304
+    boarding = boarding_details(booking)
+    etag = hashlib.sha256(
+        f"{booking.pnr}:{booking.version}:{boarding['gate']}:{boarding['boarding_time']}:"
+        f"{template_digest('base.html', 'boarding_pass.html')}".encode()).hexdigest()[:32]
+    if etag in request.if_none_match and not session.get('_flashes'):
+        response = Response(status=304)
+    else:
+        response = make_response(render_template('boarding_pass.html',
+                                                  booking=booking,
+                                                  boarding=boarding,
+                                                  duration=duration_filter(
+                                                      booking.flight.arrival_time - booking.flight.departure_time)))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 if __name__ == '__main__':
     with app.app_context():
@@ -0,0 +1,150 @@
+"""Close-of-check-in auto-seating for a whole day of flights.
+
+Loads one day of timetable (~10k flights), books each flight to a random
+load factor with parties of 1-9 passengers, and lets a share of bookings
+pick their own (random) seats first. Then seats everyone else with
+auto_seat_flights (what `flask auto-seat --date` does), checks that no seat
+was given twice and that the seat maps match, and reports how the parties
+it seated sit. For comparison, a sample of flights is seated the
+one-commit-per-booking way through assign_seats, taking the first free seats.
+
+    python benchmarks/bench_auto_seat.py [flights_per_route] [naive_sample]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'auto_seat.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, User, Booking, Passenger, SEAT_ROWS, SEATS_PER_ROW, SEAT_BLOCKS,
+                 SEAT_MAP_BYTES, generate_schedule, schedule_routes, insert_flight_rows, occupied_seats,
+                 seat_index, auto_seat_flights, assign_seats)
+
+TRAVEL_DATE = date(2030, 1, 1)
+PARTY_SIZES = [1] * 50 + [2] * 28 + [3] * 10 + [4] * 7 + [5] * 2 + [6] * 2 + [9]
+CABIN = len(SEAT_ROWS) * SEATS_PER_ROW
+
+
+def book_day(rng, flight_ids):
+    """Bookings and passengers with Core executemany; ~20% of bookings already picked their seats."""
+    bookings, passengers, seat_maps, preseated = [], [], [], set()
+    booking_id = passenger_id = 0
+    for flight_id in flight_ids:
+        target = int(CABIN * rng.uniform(0.5, 1.0))
+        free = [f"{row}{col}" for row in SEAT_ROWS for col in range(1, SEATS_PER_ROW + 1)]
+        rng.shuffle(free)
+        bits = 0
+        booked = 0
+        while booked < target:
+            size = rng.choice(PARTY_SIZES)
+            booking_id += 1
+            if rng.random() < 0.2 and len(free) >= size:
+                preseated.add(booking_id)
+            bookings.append({'id': booking_id, 'user_id': 1, 'flight_id': flight_id, 'status': 'Confirmed',
+                             'passenger_count': size, 'pnr': f"{booking_id:08d}", 'version': 1})
+            for _ in range(size):
+                passenger_id += 1
+                seat = free.pop() if booking_id in preseated else None
+                if seat:
+                    bits |= 1 << seat_index(seat)
+                passengers.append({'id': passenger_id, 'booking_id': booking_id, 'first_name': 'P',
+                                   'last_name': str(passenger_id), 'age': 30, 'gender': 'F', 'seat_number': seat})
+            booked += size
+        seat_maps.append({'flight_id': flight_id, 'seat_map': bits.to_bytes(SEAT_MAP_BYTES, 'big')})
+
+    flights = Flight.__table__
+    db.session.execute(Booking.__table__.insert(), bookings)
+    db.session.execute(Passenger.__table__.insert(), passengers)
+    db.session.execute(flights.update().where(flights.c.id == db.bindparam('flight_id'))
+                       .values(seat_map=db.bindparam('seat_map')), seat_maps)
+    db.session.commit()
+    return len(bookings), len(passengers), preseated
+
+
+def check(flight_ids, preseated):
+    """No seat twice per flight, seat map == seated passengers, and how each party was seated."""
+    seats_by_flight, parties = defaultdict(list), defaultdict(list)
+    for flight_id, booking_id, seat in db.session.execute(
+            db.select(Booking.flight_id, Booking.id, Passenger.seat_number)
+            .join(Passenger, Passenger.booking_id == Booking.id)
+            .where(Booking.flight_id.in_(flight_ids))):
+        if seat:
+            seats_by_flight[flight_id].append(seat)
+            parties[booking_id].append(seat)
+    for flight_id, seat_map in db.session.execute(
+            db.select(Flight.id, Flight.seat_map).where(Flight.id.in_(flight_ids))):
+        seats = seats_by_flight[flight_id]
+        assert len(seats) == len(set(seats)), f'flight {flight_id} has a seat given twice'
+        assert sorted(seats) == sorted(occupied_seats(seat_map)), f'flight {flight_id} seat map out of sync'
+
+    outcome = defaultdict(int)
+    for booking_id, seats in parties.items():
+        if len(seats) < 2 or booking_id in preseated:
+            continue
+        rows = {seat[0] for seat in seats}
+        indexes = sorted(int(seat[1:]) - 1 for seat in seats)
+        if len(rows) == 1 and any(set(indexes) <= set(block) for block in SEAT_BLOCKS):
+            outcome['same row, between the same aisles'] += 1
+        elif len(rows) == 1 and indexes == list(range(indexes[0], indexes[-1] + 1)):
+            outcome['same row, across an aisle'] += 1
+        elif len(rows) == 1:
+            outcome['same row, not adjacent'] += 1
+        else:
+            outcome['split over rows'] += 1
+    return outcome
+
+
+def first_free_seats(booking):
+    taken = set(occupied_seats(booking.flight.seat_map))
+    unseated = [p for p in booking.passengers if not p.seat_number]
+    free = [f"{row}{col}" for row in SEAT_ROWS for col in range(1, SEATS_PER_ROW + 1)
+            if f"{row}{col}" not in taken]
+    return [p.seat_number for p in booking.passengers if p.seat_number] + free[:len(unseated)]
+
+
+def main(flights_per_route=11, naive_sample=20):
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='bench', email='bench@example.com', password='x'))
+        insert_flight_rows(generate_schedule(schedule_routes(), [TRAVEL_DATE], flights_per_route))
+        db.session.commit()
+        flight_ids = db.session.scalars(db.select(Flight.id).order_by(Flight.id)).all()
+        started = time.perf_counter()
+        bookings, passengers, preseated = book_day(rng, flight_ids)
+        print(f"{len(flight_ids):,} flights, {bookings:,} bookings, {passengers:,} passengers "
+              f"loaded in {time.perf_counter() - started:.1f}s")
+
+        naive_ids, day_ids = flight_ids[:naive_sample], flight_ids[naive_sample:]
+        started = time.perf_counter()
+        commits = 0
+        for booking in Booking.query.filter(Booking.flight_id.in_(naive_ids)).order_by(Booking.id):
+            if any(not p.seat_number for p in booking.passengers):
+                assign_seats(booking, first_free_seats(booking)[:booking.passenger_count])
+                commits += 1
+        naive = time.perf_counter() - started
+        print(f"one commit per booking: {len(naive_ids)} flights in {naive:.1f}s ({commits:,} commits), "
+              f"~{naive / len(naive_ids) * len(flight_ids):.0f}s for the day")
+
+        day_start = datetime.combine(TRAVEL_DATE, datetime.min.time())
+        flights, seated, unseated, seconds = auto_seat_flights(
+            Flight.id.in_(day_ids), Flight.departure_time >= day_start,
+            Flight.departure_time < day_start + timedelta(days=1))
+        print(f"auto_seat_flights: {flights:,} flights, {seated:,} passengers seated in {seconds:.1f}s "
+              f"({flights / seconds:,.0f} flights/s), {unseated:,} left without a seat")
+
+        for label, ids in (('first free seats', naive_ids), ('auto-seat', day_ids)):
+            outcome = check(ids, preseated)
+            total = sum(outcome.values())
+            print(f"{label:>16}: " + ', '.join(f"{name} {count / total:.0%}" for name, count in sorted(outcome.items())))
+        print('OK')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,73 @@
+"""Boarding pass refreshes: full renders vs. ETag revalidation, and opening check-in for a day.
+
+Opens check-in (gate and boarding time) for one day of timetable, the way
+`flask open-checkin` does, then checks in a booking and requests its
+boarding pass repeatedly through the test client: once without and once
+with If-None-Match, as a phone refreshing the page would.
+
+    python benchmarks/bench_boarding_pass.py [flights_per_route] [refreshes]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TMP, 'boarding.db')}",
+    SESSION_COOKIE_SECURE='0',
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, FlightBoarding, User, generate_schedule, schedule_routes, insert_flight_rows,
+                 open_checkin, create_booking, generate_password_hash)
+
+
+def timed_requests(client, url, refreshes, headers=None):
+    samples, statuses = [], set()
+    for _ in range(refreshes):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append(time.perf_counter() - started)
+        statuses.add(response.status_code)
+    return statistics.median(samples) * 1000, sorted(samples)[int(refreshes * 0.95)] * 1000, statuses, response
+
+
+def main(flights_per_route=11, refreshes=500):
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='flyer', email='flyer@example.com', password=generate_password_hash('x')))
+        insert_flight_rows(generate_schedule(schedule_routes(), [tomorrow], flights_per_route))
+        db.session.commit()
+
+        started = time.perf_counter()
+        opened = open_checkin(Flight.departure_time <= datetime.now() + app.config['CHECKIN_OPENS'])
+        print(f"open_checkin: {opened:,} flights in {time.perf_counter() - started:.2f}s")
+        assert open_checkin() == 0  # Computed once: a second run finds nothing to do
+
+        flight = Flight.query.first()
+        pnr = create_booking(User.query.first().id, {
+            'flight_id': flight.id, 'num_passengers': 2,
+            'passengers': [{'first_name': 'Ada', 'last_name': 'Flyer', 'age': 30, 'gender': 'F'}] * 2
+        }).pnr
+        gate = db.session.get(FlightBoarding, flight.id).gate
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'flyer', 'password': 'x'})
+    client.post(f'/checkin/{pnr}')
+    url = f'/boarding-pass/{pnr}'
+
+    p50, p95, statuses, response = timed_requests(client, url, refreshes)
+    assert gate in response.get_data(as_text=True)
+    print(f"full render:  p50 {p50:5.2f} ms  p95 {p95:5.2f} ms  status {statuses}  {len(response.data):,} bytes")
+    p50, p95, statuses, _ = timed_requests(client, url, refreshes, {'If-None-Match': response.headers['ETag']})
+    print(f"revalidation: p50 {p50:5.2f} ms  p95 {p95:5.2f} ms  status {statuses}  0 bytes")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,110 @@
+"""Booking history page latency for an account with many bookings.
+
+Loads BOOKINGS bookings spread over 1000 users, with one agency account
+holding AGENCY_BOOKINGS of them (1% with no booking_date, as on databases
+from before it was recorded), then times /my-bookings pages for the agency
+at increasing depth, up to its last page: keyset pages (what the view does) next to
+OFFSET pages and to the same keyset query without ix_booking_user_date,
+plus the whole request through the test client.
+
+    python benchmarks/bench_booking_history.py [bookings] [agency_bookings]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TMP, 'history.db')}",
+    SESSION_COOKIE_SECURE='0'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, User, Booking, generate_schedule, schedule_routes, insert_flight_rows,
+                 booking_history_criteria, booking_history_cursor, booking_history_date, generate_password_hash)
+
+AGENCY_ID = 1
+
+
+def load(bookings, agency_bookings):
+    rng = random.Random(0)
+    db.session.execute(User.__table__.insert(), [
+        {'id': n, 'username': f"user{n}", 'email': f"user{n}@example.com", 'password': generate_password_hash('x')
+         if n == AGENCY_ID else 'x'} for n in range(1, 1001)])
+    insert_flight_rows(generate_schedule(schedule_routes()[:100], [date(2030, 1, 1)], 10))
+    flight_ids = db.session.scalars(db.select(Flight.id)).all()
+    started = datetime(2025, 1, 1)
+    rows = [{'user_id': AGENCY_ID if n < agency_bookings else rng.randint(2, 1000),
+             'flight_id': rng.choice(flight_ids), 'pnr': f"{n:08d}", 'passenger_count': 1,
+             'status': 'Confirmed', 'version': 1,
+             'booking_date': None if rng.random() < 0.01 else started + timedelta(minutes=rng.randint(0, 10 ** 6))}
+            for n in range(bookings)]
+    for start in range(0, bookings, 100000):
+        db.session.execute(Booking.__table__.insert(), rows[start:start + 100000])
+    db.session.commit()
+
+
+def page(cursor=None, offset=None):
+    criteria = booking_history_criteria(AGENCY_ID, cursor) if offset is None else [Booking.user_id == AGENCY_ID]
+    query = db.session.query(Booking).options(db.selectinload(Booking.flight)).filter(*criteria) \
+        .order_by(booking_history_date.desc(), Booking.id.desc())
+    return query.offset(offset).limit(20).all()
+
+
+def timed(f, repeats=20):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        f()
+        samples.append(time.perf_counter() - started)
+        db.session.rollback()
+    return statistics.median(samples) * 1000
+
+
+def main(bookings=1000000, agency_bookings=100000):
+    with app.app_context():
+        db.create_all()
+        load(bookings, agency_bookings)
+        print(f"{bookings:,} bookings, {agency_bookings:,} for one account")
+
+        last = (agency_bookings - 1) // 20
+        depths = sorted({0, last // 100, last // 10, last})
+        cursors = {}
+        dates = db.session.execute(
+            db.select(Booking.booking_date, Booking.id).where(Booking.user_id == AGENCY_ID)
+            .order_by(booking_history_date.desc(), Booking.id.desc())).all()
+        for depth in depths:
+            cursors[depth] = booking_history_cursor(*dates[depth * 20 - 1]) if depth else None
+            assert [b.id for b in page(cursors[depth])] == [b.id for b in page(offset=depth * 20)]
+
+        results = {depth: [timed(lambda: page(cursors[depth])), timed(lambda: page(offset=depth * 20))]
+                   for depth in depths}
+
+    # Outside the app context, so each request gets its own (and its own query count)
+    client = app.test_client()
+    client.post('/login', data={'username': f"user{AGENCY_ID}", 'password': 'x'})
+    for depth in (0, depths[-1]):
+        url = f"/my-bookings?cursor={cursors[depth]}" if cursors[depth] else '/my-bookings'
+        samples = []
+        for _ in range(20):
+            started = time.perf_counter()
+            assert client.get(url).status_code == 200
+            samples.append(time.perf_counter() - started)
+        print(f"GET /my-bookings, page {depth + 1}: {statistics.median(samples) * 1000:.1f} ms")
+
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX ix_booking_user_date'))
+        db.session.commit()
+        for depth in depths:
+            results[depth].append(timed(lambda: page(cursors[depth]), 3))
+
+    for depth, (keyset, offset, unindexed) in results.items():
+        print(f"page {depth + 1:>5}: keyset {keyset:7.2f} ms   offset {offset:7.2f} ms   "
+              f"keyset without index {unindexed:7.2f} ms")
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
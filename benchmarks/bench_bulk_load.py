@@ -0,0 +1,72 @@
+"""Bulk schedule import throughput.
+
+Writes a timetable of N flights to a CSV file, then loads it with
+`bulk_load_flights` (the `flask load-schedule` path) into a fresh SQLite
+database. A small sample is also loaded one ORM object at a time, the way
+add_sample_data used to, for comparison.
+
+    python benchmarks/bench_bulk_load.py [flights] [orm_sample]
+"""
+import csv
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'bulk.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, generate_schedule, schedule_routes, read_schedule_file,
+                 bulk_load_flights)
+
+FIELDS = ['flight_number', 'airline', 'departure', 'destination', 'departure_time', 'arrival_time',
+          'price', 'total_seats']
+
+
+def write_timetable(path, count):
+    routes = schedule_routes()
+    per_day = len(routes) * 2
+    days = -(-count // per_day)
+    rows = generate_schedule(routes, [date(2030, 1, 1) + timedelta(days=n) for n in range(days)], 2)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for _, row in zip(range(count), rows):
+            writer.writerow(dict(row, departure_time=row['departure_time'].isoformat(),
+                                 arrival_time=row['arrival_time'].isoformat()))
+
+
+def orm_load(path, count):
+    started = time.perf_counter()
+    for _, row in zip(range(count), read_schedule_file(path)):
+        db.session.add(Flight(**row))
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def main(count=1000000, orm_sample=20000):
+    path = os.path.join(TMP, 'timetable.csv')
+    write_timetable(path, count)
+    print(f"timetable: {count:,} rows, {os.path.getsize(path) / 1e6:.0f} MB")
+
+    with app.app_context():
+        db.create_all()
+        loaded, seconds = bulk_load_flights(
+            read_schedule_file(path),
+            progress=lambda n, s: print(f"  {n:>10,} rows  {n / s:>9,.0f} rows/s"))
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"bulk:  {loaded:,} rows in {seconds:.1f}s ({loaded / seconds:,.0f} rows/s), "
+              f"peak RSS {peak_mb:.0f} MB")
+
+        db.drop_all()
+        db.create_all()
+        sample = min(orm_sample, count)
+        seconds = orm_load(path, sample)
+        print(f"ORM:   {sample:,} rows in {seconds:.1f}s ({sample / seconds:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,85 @@
+"""Connection search latency on the in-memory route graph.
+
+Generates a timetable with FLIGHTS_PER_ROUTE departures per route per day
+between every airport pair (31 airports -> ~30k legs a day), then times
+RouteGraph.itineraries (up to 2 stops) for random origin/destination pairs,
+cold (day not loaded) and warm. For comparison, one-stop connections are
+also found with a self-join on flight for a few pairs.
+
+    python benchmarks/bench_connections.py [flights_per_route] [searches]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'connections.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import aliased
+
+from app import (app, db, Flight, AIRPORTS, route_graph, generate_schedule, schedule_routes,
+                 insert_flight_rows)
+
+TRAVEL_DATE = date(2030, 1, 1)
+
+
+def self_join_one_stop(origin, destination):
+    first, second = aliased(Flight), aliased(Flight)
+    day_start = datetime.combine(TRAVEL_DATE, datetime.min.time())
+    return db.session.execute(
+        db.select(first.id, second.id)
+        .join(second, second.departure == first.destination)
+        .where(first.departure == origin,
+               first.departure_time >= day_start,
+               first.departure_time < day_start + timedelta(days=1),
+               second.destination == destination,
+               second.departure_time >= first.arrival_time + timedelta(minutes=45),
+               second.departure_time <= first.departure_time + timedelta(hours=24))
+    ).all()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000)
+
+
+def main(flights_per_route=32, searches=200):
+    rng = random.Random(0)
+    pairs = [tuple(rng.sample(sorted(AIRPORTS), 2)) for _ in range(searches)]
+
+    with app.app_context():
+        db.create_all()
+        dates = [TRAVEL_DATE + timedelta(days=n) for n in range(2)]
+        count = insert_flight_rows(generate_schedule(schedule_routes(), dates, flights_per_route))
+        db.session.commit()
+        print(f"{count // len(dates):,} legs per day on {len(schedule_routes())} routes")
+
+        started = time.perf_counter()
+        route_graph.itineraries(*pairs[0], TRAVEL_DATE)
+        print(f"cold (loads {len(dates)} days): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        timings, found = [], 0
+        for origin, destination in pairs:
+            started = time.perf_counter()
+            found += len(route_graph.itineraries(origin, destination, TRAVEL_DATE))
+            timings.append(time.perf_counter() - started)
+        p50, p95 = percentiles(timings)
+        print(f"route graph, <=2 stops: {searches} searches  p50 {p50:.1f} ms  p95 {p95:.1f} ms  "
+              f"({found / searches:.0f} itineraries each)")
+
+        timings = []
+        for origin, destination in pairs[:10]:
+            started = time.perf_counter()
+            self_join_one_stop(origin, destination)
+            timings.append(time.perf_counter() - started)
+        p50, p95 = percentiles(timings)
+        print(f"self-join, 1 stop only:  10 searches  p50 {p50:.1f} ms  p95 {p95:.1f} ms")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,66 @@
+"""Fare calendar latency by window size.
+
+Loads a year of timetable (every route, SCHEDULE_FLIGHTS_PER_DAY flights a
+day) and times the fare calendar's single grouped query for windows of 3 to
+61 days, next to the old way of finding the cheapest day: one flight
+search per date.
+
+    python benchmarks/bench_fare_calendar.py [days_of_schedule] [repeats]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'fares.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, AIRPORTS, generate_schedule, schedule_routes, insert_flight_rows,
+                 fare_calendar_query, fare_calendar_days, flight_search_criteria)
+
+START = date(2030, 1, 1)
+
+
+def timed(f, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        f()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main(schedule_days=365, repeats=50):
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        dates = [START + timedelta(days=n) for n in range(schedule_days)]
+        count = insert_flight_rows(generate_schedule(schedule_routes(), dates, app.config['SCHEDULE_FLIGHTS_PER_DAY']))
+        db.session.commit()
+        print(f"{count:,} flights over {schedule_days} days")
+
+        for half_window in (1, 3, 7, 15, 30):
+            departure, destination = rng.sample(sorted(AIRPORTS), 2)
+            middle = START + timedelta(days=schedule_days // 2)
+            start_date, end_date = middle - timedelta(days=half_window), middle + timedelta(days=half_window)
+
+            def calendar():
+                rows = db.session.execute(fare_calendar_query(departure, destination, start_date, end_date, 1))
+                return fare_calendar_days(rows, start_date, end_date)
+
+            def per_day_searches():
+                return [min((f.price for f in Flight.query.filter(
+                    *flight_search_criteria(departure, destination, start_date + timedelta(days=n), 1))),
+                    default=None) for n in range((end_date - start_date).days + 1)]
+
+            assert [day['min_price'] for day in calendar()] == per_day_searches()
+            print(f"{2 * half_window + 1:>3}-day window: calendar query {timed(calendar, repeats):6.2f} ms   "
+                  f"one search per day {timed(per_day_searches, max(1, repeats // 10)):7.2f} ms")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,110 @@
+"""Booking traffic during a credential-stuffing burst, with and without login controls.
+
+Attacker threads post wrong passwords to /login for a few usernames from a
+handful of IPs while other threads keep searching flights. The run is done
+twice: once with an effectively unbounded hashing pool and no throttling,
+once with the configured PASSWORD_HASH_* pool and LOGIN_* token buckets.
+Reports search latency, login attempts handled, and the auth metrics.
+
+    python benchmarks/bench_login.py [seconds] [attackers] [searchers]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TMP, 'login.db')}",
+    SESSION_COOKIE_SECURE='0',
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as airline
+from app import app, db, User, Flight, extend_schedule, generate_password_hash
+
+USERNAMES = [f'user{n}' for n in range(20)]
+IPS = [f'203.0.113.{n}' for n in range(8)]
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        extend_schedule(datetime.now().date() + timedelta(days=1), 3)
+        password = generate_password_hash('right', method=app.config['PASSWORD_HASH_METHOD'])
+        for username in USERNAMES + ['shopper']:
+            db.session.add(User(username=username, email=f'{username}@example.com', password=password))
+        db.session.commit()
+        return [{'departure': f.departure, 'destination': f.destination,
+                 'travel_date': f.departure_time.strftime('%Y-%m-%d'), 'passengers': 1}
+                for f in Flight.query.limit(200)]
+
+
+def configure(bounded):
+    config = app.config
+    if bounded:
+        workers, queue = config['PASSWORD_HASH_WORKERS'], config['PASSWORD_HASH_QUEUE']
+        user_burst, ip_burst = config['LOGIN_USERNAME_BURST'], config['LOGIN_IP_BURST']
+    else:
+        workers, queue, user_burst, ip_burst = 256, 10000, 10 ** 9, 10 ** 9
+    airline.password_hasher = airline.PasswordHasher(config['PASSWORD_HASH_METHOD'], workers, queue,
+                                                     config['PASSWORD_HASH_WAIT'])
+    airline.login_username_limiter = airline.TokenBucketLimiter(user_burst, config['LOGIN_USERNAME_RATE'])
+    airline.login_ip_limiter = airline.TokenBucketLimiter(ip_burst, config['LOGIN_IP_RATE'])
+
+
+def run(searches, seconds, attackers, searchers):
+    deadline = time.perf_counter() + seconds
+    latencies, attempts = [], []
+
+    def attack(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = client.post('/login', data={'username': rng.choice(USERNAMES), 'password': 'wrong'},
+                                   environ_base={'REMOTE_ADDR': rng.choice(IPS)})
+            attempts.append(response.status_code)
+
+    def search(n):
+        rng = random.Random(-n)
+        client = app.test_client()
+        client.post('/login', data={'username': 'shopper', 'password': 'right'},
+                    environ_base={'REMOTE_ADDR': '198.51.100.1'})
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.post('/search-flights', data=rng.choice(searches))
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=search, args=(n,)) for n in range(searchers)]
+    threads += [threading.Thread(target=attack, args=(n,)) for n in range(attackers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), attempts
+
+
+def main(seconds=10, attackers=16, searchers=4):
+    searches = seed()
+    print(f"{attackers} attacker threads, {searchers} searching threads, {seconds}s per run, "
+          f"hash method {app.config['PASSWORD_HASH_METHOD']}")
+    for bounded in (False, True):
+        configure(bounded)
+        latencies, attempts = run(searches, seconds, attackers, searchers)
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+        hashed = sum(status == 302 for status in attempts)
+        print(f"{'bounded' if bounded else 'unbounded':>9}: searches {len(latencies) / seconds:6.1f}/s  "
+              f"p50 {statistics.median(latencies) * 1000 if latencies else float('nan'):7.1f} ms  "
+              f"p95 {p95:7.1f} ms | logins {len(attempts) / seconds:6.1f}/s, {hashed} verified, "
+              f"{attempts.count(429)} throttled, {attempts.count(503)} shed")
+        print(f"           auth metrics: {airline.password_hasher.metrics()}")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,124 @@
+"""Passenger manifest export: per-flight latency and memory while streaming.
+
+Loads one day of timetable (~10k flights) with ~75 passengers each, then:
+times the manifest query for single flights with and without the
+booking.flight_id / passenger.booking_id indexes, and streams /manifest
+(CSV) for 10, 1000 and all flights of the day through the test client while
+tracing peak Python memory, next to building the same CSV from a fully
+fetched result.
+
+    python benchmarks/bench_manifest.py [flights_per_route] [single_flight_samples]
+"""
+import csv
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+TMP = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TMP, 'manifest.db')}",
+    SESSION_COOKIE_SECURE='0',
+    OPS_USERNAMES='ops'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, Flight, User, Booking, Passenger, SEAT_ROWS, SEATS_PER_ROW, MANIFEST_FIELDS,
+                 generate_schedule, schedule_routes, insert_flight_rows, manifest_rows, generate_password_hash)
+
+TRAVEL_DATE = date(2030, 1, 1)
+
+
+def book_day(rng, flight_ids):
+    bookings, passengers = [], []
+    seats = [f"{row}{col}" for row in SEAT_ROWS for col in range(1, SEATS_PER_ROW + 1)]
+    for flight_id in flight_ids:
+        seat = iter(rng.sample(seats, len(seats)))
+        booked = 0
+        while booked < 75:
+            booking_id = len(bookings) + 1
+            size = rng.choice([1, 1, 1, 2, 2, 3, 4])
+            bookings.append({'id': booking_id, 'user_id': 1, 'flight_id': flight_id, 'status': 'Confirmed',
+                             'passenger_count': size, 'pnr': f"{booking_id:08d}", 'version': 1})
+            passengers += [{'booking_id': booking_id, 'first_name': 'Passenger', 'last_name': f"No{booking_id}",
+                            'age': 30, 'gender': 'F', 'passport': f"P{booking_id:07d}", 'seat_number': next(seat)}
+                           for _ in range(size)]
+            booked += size
+    db.session.execute(Booking.__table__.insert(), bookings)
+    db.session.execute(Passenger.__table__.insert(), passengers)
+    db.session.commit()
+    return len(passengers)
+
+
+def single_flight_ms(flight_ids, samples):
+    timings = []
+    for flight_id in flight_ids[:samples]:
+        started = time.perf_counter()
+        rows = list(manifest_rows(Flight.id == flight_id))
+        timings.append(time.perf_counter() - started)
+        assert rows
+    db.session.commit()
+    return statistics.median(timings) * 1000
+
+
+def traced(f):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = f()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def main(flights_per_route=11, samples=50):
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='ops', email='ops@example.com', password=generate_password_hash('ops')))
+        insert_flight_rows(generate_schedule(schedule_routes(), [TRAVEL_DATE], flights_per_route))
+        db.session.commit()
+        flight_ids = db.session.scalars(db.select(Flight.id).order_by(Flight.id)).all()
+        print(f"{len(flight_ids):,} flights, {book_day(rng, flight_ids):,} passengers")
+
+        rng.shuffle(flight_ids)
+        print(f"one flight, indexed:    p50 {single_flight_ms(flight_ids, samples):7.2f} ms")
+        for name in ('ix_booking_flight_id', 'ix_passenger_booking_id'):
+            db.session.execute(db.text(f'DROP INDEX {name}'))
+        print(f"one flight, unindexed:  p50 {single_flight_ms(flight_ids, max(1, samples // 10)):7.2f} ms")
+        for index in list(Booking.__table__.indexes) + list(Passenger.__table__.indexes):
+            index.create(db.engine, checkfirst=True)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'ops', 'password': 'ops'})
+    for count in (10, 1000, len(flight_ids)):
+        ids = ','.join(map(str, flight_ids[:count]))
+
+        def stream():
+            response = client.get(f'/manifest?flight_id={ids}', buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            return size
+
+        def fetch_all():
+            with app.app_context():
+                rows = list(manifest_rows(Flight.id.in_(flight_ids[:count])))
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, MANIFEST_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+                return len(buffer.getvalue().encode())
+
+        size, seconds, peak = traced(stream)
+        _, all_seconds, all_peak = traced(fetch_all)
+        print(f"{count:>6,} flights: {size / 2 ** 20:6.1f} MB CSV | streamed {seconds:5.2f}s, peak {peak:5.1f} MB"
+              f" | fetched first {all_seconds:5.2f}s, peak {all_peak:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,79 @@
+"""Repricing throughput: vectorized batches vs. a per-row ORM loop.
+
+Loads N flights spread over the coming months with random load factors,
+then runs reprice_flights (what `flask reprice` does) over all of them. A
+sample is also repriced the naive way, one ORM object at a time with the
+same fare curves in plain Python, and the two are checked to agree.
+
+    pip install numpy
+    python benchmarks/bench_reprice.py [flights] [orm_sample]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'reprice.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Flight, generate_schedule, schedule_routes, bulk_load_flights, reprice_flights
+
+
+def interpolate(x, curve):
+    if x <= curve[0][0]:
+        return curve[0][1]
+    for (x0, y0), (x1, y1) in zip(curve, curve[1:]):
+        if x <= x1:
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+    return curve[-1][1]
+
+
+def orm_reprice(count, now):
+    started = time.perf_counter()
+    for flight in Flight.query.filter(Flight.departure_time > now).order_by(Flight.id).limit(count):
+        load_factor = 1 - flight.available_seats / flight.total_seats
+        days_out = max((flight.departure_time - now).total_seconds(), 0) / 86400
+        flight.price = round(flight.base_price * interpolate(load_factor, app.config['PRICING_LOAD_CURVE'])
+                             * interpolate(days_out, app.config['PRICING_DAYS_CURVE']), 2)
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def main(count=1000000, orm_sample=20000):
+    routes = schedule_routes()
+    days = -(-count // (len(routes) * 2))
+    start = datetime.now().date() + timedelta(days=1)
+    now = datetime.now()
+
+    with app.app_context():
+        db.create_all()
+        rows = generate_schedule(routes, [start + timedelta(days=n) for n in range(days)], 2)
+        loaded, seconds = bulk_load_flights(row for _, row in zip(range(count), rows))
+        # Random load factors so the fare curves have something to do
+        db.session.execute(db.text('UPDATE flight SET available_seats = abs(random()) % (total_seats + 1)'))
+        db.session.commit()
+        print(f"{loaded:,} flights over {days} days loaded in {seconds:.1f}s")
+
+        checked, changed, seconds = reprice_flights(now=now)
+        print(f"vectorized: {checked:,} flights in {seconds:.1f}s ({checked / seconds:,.0f} flights/s), "
+              f"{changed:,} fares changed")
+
+        expected = [price for price, in db.session.execute(
+            db.select(Flight.price).where(Flight.departure_time > now).order_by(Flight.id).limit(orm_sample))]
+        db.session.execute(db.update(Flight).values(price=Flight.base_price))
+        db.session.commit()
+        sample = min(orm_sample, count)
+        seconds = orm_reprice(sample, now)
+        print(f"ORM loop:   {sample:,} flights in {seconds:.1f}s ({sample / seconds:,.0f} flights/s)")
+
+        actual = [price for price, in db.session.execute(
+            db.select(Flight.price).where(Flight.departure_time > now).order_by(Flight.id).limit(orm_sample))]
+        mismatches = sum(abs(a - b) > 0.011 for a, b in zip(actual, expected))
+        assert mismatches == 0, f'{mismatches} fares differ between the two implementations'
+        print('OK')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,92 @@
+"""Flight search latency as the flight table grows.
+
+Builds throwaway SQLite databases of increasing size with the real `flight`
+schema (including ix_flight_route_departure) and times the same query that
+`search_flights` runs.
+
+    python benchmarks/bench_search.py                 # 50 .. 1,000,000 rows
+    python benchmarks/bench_search.py 50 100000       # custom sizes
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import Flight, flight_search_criteria
+
+CITIES = ['DEL', 'BOM', 'BLR', 'HYD', 'MAA', 'CCU', 'JFK', 'LAX', 'ORD', 'LHR']
+DAYS = 60
+SEARCHES = 500
+CHUNK = 50000
+
+
+def fake_rows(count, rng):
+    base = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        departure, destination = rng.sample(CITIES, 2)
+        dep_time = base + timedelta(days=rng.randint(1, DAYS), minutes=rng.randint(0, 1439))
+        yield {
+            'flight_number': f"AI{rng.randint(100, 999)}",
+            'airline': 'AirIndia',
+            'departure': departure,
+            'destination': destination,
+            'departure_time': dep_time,
+            'arrival_time': dep_time + timedelta(hours=2),
+            'price': 7500.0,
+            'total_seats': 180,
+            'available_seats': rng.randint(0, 180)
+        }
+
+
+def build_db(path, count, rng):
+    engine = create_engine(f'sqlite:///{path}')
+    Flight.__table__.create(engine)
+    rows = fake_rows(count, rng)
+    with engine.begin() as conn:
+        while True:
+            chunk = [row for _, row in zip(range(CHUNK), rows)]
+            if not chunk:
+                break
+            conn.execute(insert(Flight), chunk)
+    return engine
+
+
+def run(count):
+    rng = random.Random(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_db(os.path.join(tmp, 'bench.db'), count, rng)
+        today = datetime.now().date()
+        timings = []
+        with Session(engine) as session:
+            for _ in range(SEARCHES):
+                departure, destination = rng.sample(CITIES, 2)
+                travel_date = today + timedelta(days=rng.randint(1, DAYS))
+                stmt = select(Flight).where(
+                    *flight_search_criteria(departure, destination, travel_date, 1)
+                ).order_by(Flight.departure_time)
+                start = time.perf_counter()
+                session.scalars(stmt).all()
+                timings.append((time.perf_counter() - start) * 1000)
+                session.expunge_all()
+
+            compiled = stmt.compile(engine, compile_kwargs={'literal_binds': True})
+            plan = session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+        engine.dispose()
+
+    timings.sort()
+    print(f"{count:>10,} rows  p50 {statistics.median(timings):7.3f} ms  "
+          f"p95 {timings[int(len(timings) * 0.95)]:7.3f} ms  plan: {plan[0][-1]}")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 10000, 100000, 1000000]
+    for size in sizes:
+        run(size)
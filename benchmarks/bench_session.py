@@ -0,0 +1,76 @@
+"""Session cookie size and (de)serialization cost, before and after drafts.
+
+"Before" is the old cookie that carried the whole 9-passenger booking,
+"after" carries only the draft id. Also times a lookup in each draft store.
+
+    python benchmarks/bench_session.py [iterations]
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'session.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, MemoryDraftStore, DatabaseDraftStore
+
+PASSENGERS = 9
+
+
+def word(rng, length):
+    return ''.join(rng.choices(string.ascii_letters, k=length))
+
+
+def booking_payload():
+    # Random names so the cookie's zlib compression doesn't flatter the "before" case
+    rng = random.Random(PASSENGERS)
+    return {
+        'user_id': 1,
+        'flight_id': 42,
+        'num_passengers': PASSENGERS,
+        'passengers': [{'first_name': word(rng, 8), 'last_name': word(rng, 10), 'age': rng.randint(1, 90),
+                        'gender': 'Female', 'passport': word(rng, 9)} for _ in range(PASSENGERS)],
+        'hold_id': 7
+    }
+
+
+def time_cookie(serializer, data, iterations):
+    cookie = serializer.dumps(data)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        serializer.loads(serializer.dumps(data))
+    per_request = (time.perf_counter() - start) / iterations * 1e6
+    return len(cookie), per_request
+
+
+def time_store(store, iterations):
+    draft_id = store.create(booking_payload())
+    start = time.perf_counter()
+    for _ in range(iterations):
+        store.get(draft_id)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations=10000):
+    serializer = app.session_interface.get_signing_serializer(app)
+    base = {'user_id': 1, 'username': 'testuser', '_permanent': True}
+
+    before = time_cookie(serializer, dict(base, pending_booking=booking_payload()), iterations)
+    after = time_cookie(serializer, dict(base, draft_id='x' * 22), iterations)
+    print(f"before: cookie {before[0]:5d} bytes, sign+verify {before[1]:7.1f} us/request")
+    print(f"after:  cookie {after[0]:5d} bytes, sign+verify {after[1]:7.1f} us/request")
+
+    with app.app_context():
+        db.create_all()
+        memory = time_store(MemoryDraftStore(1000, app.config['DRAFT_TTL']), iterations)
+        database = time_store(DatabaseDraftStore(app.config['DRAFT_TTL']), iterations)
+    print(f"draft lookup: memory {memory:7.1f} us, database {database:7.1f} us "
+          f"(only on payment/complete_booking requests)")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,369 @@
+"""Latency and throughput of the whole booking funnel, per route, checked against a stored baseline.
+
+Seeds a throwaway database with `add_sample_data` (DAYS days of timetable,
+FLIGHTS_PER_DAY flights per route and day), then runs JOURNEYS virtual users,
+CONCURRENCY at a time. Each user walks the funnel once as a new customer:
+
+    signup -> login -> search_flights -> book_flight -> process_booking -> payment
+    -> complete_booking -> checkin -> save_seats -> boarding_pass -> download_ticket
+
+With `--mode client` the requests go through the Flask test client in this
+process; with `--mode http` they go over real HTTP to gunicorn with WORKERS
+sync workers. A step that returns anything but the expected response counts
+as an error and ends that user's journey. The report gives p50/p95/p99
+latency and req/s for every route.
+
+Results are compared with benchmarks/baselines/funnel-<mode>.json when it
+exists: a route whose p50 or p95 is more than TOLERANCE above its baseline
+(plus a few ms of slack), a drop in journeys/s of more than TOLERANCE, or any
+errors fail the run with exit status 1. `--save-baseline` records this run instead.
+Baselines are only comparable on the same machine with the same arguments;
+against any other baseline the run exits with status 2 without comparing.
+Routes run with QUERY_BUDGET_STRICT=1, so a response flagged as over its query budget is an error.
+
+    python benchmarks/funnel.py [--mode client|http] [--journeys 200] [--concurrency 8]
+                                [--days 3] [--flights-per-day 2] [--workers 2]
+                                [--warmup 4] [--tolerance 0.25] [--save-baseline] [--baseline PATH]
+
+`--mode http` needs gunicorn (pip install gunicorn).
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+TMP = tempfile.mkdtemp()
+ENV = dict(
+    os.environ,
+    DATABASE_URL=f"sqlite:///{os.path.join(TMP, 'funnel.db')}",
+    FLASK_SECRET_KEY='load-test',  # Shared by every worker so sessions survive worker hops
+    SESSION_COOKIE_SECURE='0',
+    LOGIN_IP_BURST='10000',  # Every client logs in from 127.0.0.1
+    PASSWORD_HASH_QUEUE='10000',  # Measure hashing latency, not load shedding
+    QUERY_BUDGET_STRICT='1',  # Flags responses over their query budget, which fails the run
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+os.environ.update(ENV)
+sys.path.insert(0, ROOT)
+
+from app import app, Flight, SEAT_ROWS, SEATS_PER_ROW, init_db
+
+PORT = 8766
+ROUTES = ('signup', 'login', 'search_flights', 'book_flight', 'process_booking', 'payment', 'complete_booking',
+          'checkin', 'save_seats', 'boarding_pass', 'download_ticket')
+# Absolute allowance on top of TOLERANCE, so millisecond routes don't fail on noise; the tail is
+# mostly time spent queued behind other users' requests and varies more between runs
+SLACK_MS = {'p50_ms': 5, 'p95_ms': 20}
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class TestClientSession:
+    def __init__(self, base=None):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, payload=None):
+        response = self.client.open(path, method=method, data=data, json=payload)
+        return response.status_code, response.headers, response.data
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # Each hop is timed as its own request
+
+
+class HTTPSession:
+    def __init__(self, base):
+        self.base = base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, method, path, data=None, payload=None):
+        headers = {}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(self.base + path, body, headers, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:  # Redirects and error statuses
+            return e.code, e.headers, e.read()
+
+
+class SeatPlan:
+    """Hands each journey a flight and seats nobody else in this run was given."""
+
+    def __init__(self, flights, seed=0):
+        self.flights = flights
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        seats = [f"{row}{col}" for row in SEAT_ROWS for col in range(1, SEATS_PER_ROW + 1)]
+        self.free = {flight[0]: list(seats) for flight in flights}
+
+    def take(self, passengers):
+        with self.lock:
+            while True:
+                flight = self.rng.choice(self.flights)
+                free = self.free[flight[0]]
+                if len(free) >= passengers:
+                    return flight, [free.pop(0) for _ in range(passengers)]
+                self.flights.remove(flight)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.journeys = 0
+
+    def step(self, session, route, method, path, expect, data=None, payload=None, location=None):
+        """Time one request; `location` is a pattern the redirect path must match."""
+        started = time.perf_counter()
+        try:
+            status, headers, body = session.request(method, path, data=data, payload=payload)
+        except OSError:
+            status, headers, body = None, {}, b''
+        elapsed = time.perf_counter() - started
+        redirect, over_budget = headers.get('Location', ''), headers.get('X-Query-Budget-Exceeded')
+        ok = (status == expect and not over_budget
+              and (location is None or re.fullmatch(location, urllib.parse.urlsplit(redirect).path)))
+        with self.lock:
+            self.samples[route].append(elapsed)
+            self.errors[route] += not ok
+        if not ok:
+            raise JourneyFailed(f"{route}: {status} {redirect}" + (f" (queries {over_budget})" if over_budget else ''))
+        return redirect, body
+
+    def fail(self, route, message):
+        with self.lock:
+            self.errors[route] += 1
+        raise JourneyFailed(f"{route}: {message}")
+
+
+def journey(session, recorder, plan, n, rng):
+    username = f"funnel{n}"
+    passengers = rng.choice([1, 1, 2, 2, 3])
+    (flight_id, departure, destination, travel_date), seats = plan.take(passengers)
+
+    recorder.step(session, 'signup', 'POST', '/signup', 302, location='/login',
+                  data={'username': username, 'email': f"{username}@example.com", 'password': 'funnel-pass'})
+    recorder.step(session, 'login', 'POST', '/login', 302, location='/',
+                  data={'username': username, 'password': 'funnel-pass'})
+    _, body = recorder.step(session, 'search_flights', 'POST', '/search-flights', 200, data={
+        'departure': departure, 'destination': destination, 'travel_date': travel_date, 'passengers': passengers})
+    if f"/book-flight/{flight_id}".encode() not in body:
+        recorder.fail('search_flights', f"flight {flight_id} not listed")
+    recorder.step(session, 'book_flight', 'GET', f"/book-flight/{flight_id}?passengers={passengers}", 200)
+
+    form = {'flight_id': flight_id, 'num_passengers': passengers}
+    for i in range(1, passengers + 1):
+        form.update({f'first_name_{i}': 'Load', f'last_name_{i}': f'Tester{n}', f'age_{i}': 30, f'gender_{i}': 'F'})
+    recorder.step(session, 'process_booking', 'POST', '/process-booking', 302, data=form, location='/payment')
+    recorder.step(session, 'payment', 'GET', '/payment', 200)
+    ticket_url, _ = recorder.step(session, 'complete_booking', 'POST', '/complete-booking', 302, data={},
+                                  location=r'/ticket/\w+')
+    pnr = ticket_url.rsplit('/', 1)[-1]
+
+    recorder.step(session, 'checkin', 'POST', f"/checkin/{pnr}", 302, location=r'/select-seats/\w+')
+    _, body = recorder.step(session, 'save_seats', 'POST', '/save-seats', 200, payload={'pnr': pnr, 'seats': seats})
+    if not json.loads(body).get('success'):
+        recorder.fail('save_seats', body[:200].decode(errors='replace'))
+    recorder.step(session, 'boarding_pass', 'GET', f"/boarding-pass/{pnr}", 200)
+    recorder.step(session, 'download_ticket', 'GET', f"/ticket/{pnr}/download", 200)
+    with recorder.lock:
+        recorder.journeys += 1
+
+
+def run_journeys(session_class, base, plan, journeys, concurrency, first=0):
+    recorder = Recorder()
+    failures = []
+    counter = iter(range(first, first + journeys))
+    counter_lock = threading.Lock()
+
+    def work(worker):
+        rng = random.Random(worker)
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            try:
+                journey(session_class(base), recorder, plan, n, rng)
+            except JourneyFailed as e:
+                failures.append(str(e))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, failures, time.perf_counter() - started
+
+
+def seed(days, flights_per_day):
+    app.config['SAMPLE_SCHEDULE_DAYS'] = days
+    app.config['SCHEDULE_FLIGHTS_PER_DAY'] = flights_per_day
+    init_db()
+    with app.app_context():
+        flights = [(f.id, f.departure, f.destination, f.departure_time.strftime('%Y-%m-%d'))
+                   for f in Flight.query.order_by(Flight.id)]
+    return len(flights), random.Random(0).sample(flights, min(500, len(flights)))  # Same flights every run
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+
+def summarize(recorder, seconds):
+    routes = {}
+    for route in ROUTES:
+        samples = sorted(recorder.samples[route])
+        routes[route] = {
+            'count': len(samples), 'errors': recorder.errors[route],
+            'p50_ms': round(statistics.median(samples) * 1000, 2) if samples else None,
+            'p95_ms': round(percentile(samples, 0.95), 2) if samples else None,
+            'p99_ms': round(percentile(samples, 0.99), 2) if samples else None,
+            'rps': round(len(samples) / seconds, 2)
+        }
+    requests = sum(route['count'] for route in routes.values())
+    return {'routes': routes, 'journeys': recorder.journeys, 'seconds': round(seconds, 2),
+            'journeys_per_s': round(recorder.journeys / seconds, 2), 'requests_per_s': round(requests / seconds, 2)}
+
+
+def report(result):
+    print(f"{'route':<17}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}")
+    for route, stats in result['routes'].items():
+        latencies = ''.join(f"{stats[key]:9.1f}" if stats[key] is not None else f"{'-':>9}"
+                            for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"{route:<17}{stats['count']:>7}{stats['errors']:>8}{latencies}{stats['rps']:9.1f}")
+    print(f"{result['journeys']} journeys in {result['seconds']:.1f}s: {result['journeys_per_s']:.2f} journeys/s, "
+          f"{result['requests_per_s']:.1f} req/s")
+
+
+def regressions(result, baseline, tolerance):
+    found = []
+    for route, stats in result['routes'].items():
+        if stats['errors']:
+            found.append(f"{route}: {stats['errors']} errors")
+        for key, slack in SLACK_MS.items():
+            before = baseline['routes'].get(route, {}).get(key)
+            if before is not None and stats[key] is not None and stats[key] > before * (1 + tolerance) + slack:
+                found.append(f"{route}: {key[:3]} {stats[key]:.1f} ms vs. baseline {before:.1f} ms")
+    if result['journeys_per_s'] < baseline['journeys_per_s'] * (1 - tolerance):
+        found.append(f"throughput: {result['journeys_per_s']:.2f} journeys/s "
+                     f"vs. baseline {baseline['journeys_per_s']:.2f}")
+    return found
+
+
+def start_gunicorn(workers):
+    gunicorn = shutil.which('gunicorn')
+    if not gunicorn:
+        sys.exit('gunicorn is required for --mode http: pip install gunicorn')
+    base = f'http://127.0.0.1:{PORT}'
+    process = subprocess.Popen([gunicorn, '-w', str(workers), '-b', f'127.0.0.1:{PORT}', 'app:app'],
+                               cwd=ROOT, env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return base, process
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--journeys', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--days', type=int, default=3, help='days of timetable to seed')
+    parser.add_argument('--flights-per-day', type=int, default=2, help='flights per route and day')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (--mode http)')
+    parser.add_argument('--warmup', type=int, default=4, help='unrecorded journeys run first')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--baseline')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+    baseline_path = args.baseline or os.path.join(BASELINES, f"funnel-{args.mode}.json")
+
+    flights, sample = seed(args.days, args.flights_per_day)
+    plan = SeatPlan(sample)
+    print(f"{args.mode} mode: {flights:,} flights, {args.journeys} journeys, {args.concurrency} concurrent"
+          + (f", {args.workers} gunicorn workers" if args.mode == 'http' else ''))
+
+    base, process = start_gunicorn(args.workers) if args.mode == 'http' else (None, None)
+    session_class = HTTPSession if args.mode == 'http' else TestClientSession
+    try:
+        _, failures, _ = run_journeys(session_class, base, plan, args.warmup, 1, first=-args.warmup)
+        recorder, more_failures, seconds = run_journeys(session_class, base, plan, args.journeys, args.concurrency)
+        failures += more_failures
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    result = summarize(recorder, seconds)
+    report(result)
+    for failure in failures[:10]:
+        print(f"  failed: {failure}")
+    result['params'] = {key: getattr(args, key) for key in
+                        ('mode', 'journeys', 'concurrency', 'days', 'flights_per_day', 'warmup')}
+    if args.mode == 'http':
+        result['params']['workers'] = args.workers
+    result['machine'] = {'platform': platform.platform(), 'python': platform.python_version(),
+                         'cpus': os.cpu_count()}
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"baseline saved to {os.path.relpath(baseline_path)}")
+        return 1 if failures else 0
+    if not os.path.exists(baseline_path):
+        print(f"no baseline at {os.path.relpath(baseline_path)}; run with --save-baseline to record one")
+        return 1 if failures else 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    for key in ('params', 'machine'):
+        if baseline.get(key) != result[key]:
+            print(f"baseline not comparable: recorded with {key} {baseline.get(key)}, this run has {result[key]}")
+            print('record one for this setup with --save-baseline, or pass --baseline')
+            return 2
+    found = regressions(result, baseline, args.tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    print('FAIL' if found else f"OK: within {args.tolerance:.0%} of {os.path.relpath(baseline_path)}")
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Concurrent-connection capacity: async JSON API vs. the WSGI search route.
+
+Seeds a throwaway database and starts two servers on it, each with the same
+number of worker processes:
+
+- gunicorn (sync workers) serving POST /search-flights
+- uvicorn serving GET /api/flights
+
+It then opens 10, 100 and 1000 concurrent keep-alive connections against
+each server. Every connection is a slow client: it waits THINK seconds
+between searches and keeps its connection open the whole time. A request
+counts as failed if it errors out or takes longer than TIMEOUT. Both servers
+authenticate with one session cookie from /login.
+
+    pip install gunicorn uvicorn httpx
+    python benchmarks/load_api.py [seconds] [workers] [connections ...]
+"""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp()
+ENV = dict(
+    os.environ,
+    DATABASE_URL=os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'load.db')}"),
+    FLASK_SECRET_KEY='load-test',  # Shared by both servers so one login works for each
+    SESSION_COOKIE_SECURE='0',
+    LOGIN_IP_BURST='10000',  # Every client logs in from 127.0.0.1
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+os.environ.update(ENV)
+sys.path.insert(0, ROOT)
+
+from app import app, db, User, Flight, extend_schedule, generate_password_hash
+
+WSGI_PORT, ASGI_PORT = 8765, 8766
+THINK = 0.5  # seconds each client idles between requests
+TIMEOUT = 10
+
+
+def seed():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        extend_schedule(datetime.now().date() + timedelta(days=1), 3)
+        db.session.add(User(username='load', email='load@example.com',
+                            password=generate_password_hash('load', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+        return [(f.departure, f.destination, f.departure_time.strftime('%Y-%m-%d'))
+                for f in Flight.query.limit(500)]
+
+
+def start(command, base):
+    process = subprocess.Popen(command, cwd=ROOT, env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError(f'{command[0]} exited during startup')
+        try:
+            urllib.request.urlopen(base, timeout=1).read()
+            return process
+        except urllib.error.HTTPError:
+            return process  # Up, just not a page we can GET anonymously
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{command[0]} did not start')
+
+
+def login(base):
+    with httpx.Client(base_url=base) as client:
+        client.post('/login', data={'username': 'load', 'password': 'load'})
+        return client.cookies['session']
+
+
+def wsgi_search(client, route):
+    departure, destination, travel_date = route
+    return client.post('/search-flights', data={'departure': departure, 'destination': destination,
+                                                'travel_date': travel_date, 'passengers': 1})
+
+
+def api_search(client, route):
+    departure, destination, travel_date = route
+    return client.get('/api/flights', params={'departure': departure, 'destination': destination,
+                                              'date': travel_date})
+
+
+async def run_clients(base, cookie, search, routes, seconds, connections):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base, cookies={'session': cookie}, limits=limits,
+                                 timeout=TIMEOUT) as client:
+        async def work(n):
+            nonlocal errors
+            rng = random.Random(n)
+            await asyncio.sleep(rng.random() * THINK)  # Spread the first wave
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await search(client, rng.choice(routes))
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                await asyncio.sleep(THINK)
+
+        await asyncio.gather(*(work(n) for n in range(connections)))
+    return latencies, errors
+
+
+def report(label, connections, seconds, latencies, errors):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+    print(f"{label:<5} {connections:>5} connections: {len(latencies) / seconds:8.1f} req/s  "
+          f"p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  failed {errors}")
+
+
+def main(seconds=15, workers=1, connections=(10, 100, 1000)):
+    gunicorn, uvicorn = shutil.which('gunicorn'), shutil.which('uvicorn')
+    if not gunicorn or not uvicorn:
+        sys.exit('gunicorn and uvicorn are required: pip install gunicorn uvicorn')
+
+    routes = seed()
+    wsgi_base, asgi_base = f'http://127.0.0.1:{WSGI_PORT}', f'http://127.0.0.1:{ASGI_PORT}'
+    servers = [
+        start([gunicorn, '-w', str(workers), '-b', f'127.0.0.1:{WSGI_PORT}', 'app:app'], wsgi_base),
+        start([uvicorn, '--workers', str(workers), '--port', str(ASGI_PORT), '--log-level', 'warning', 'api:api'],
+              asgi_base)
+    ]
+    try:
+        cookie = login(wsgi_base)
+        print(f"database: {ENV['DATABASE_URL']}, {workers} worker(s) each, {seconds}s per run, "
+              f"{THINK}s think time, {TIMEOUT}s timeout")
+        for count in connections:
+            for label, base, search in (('wsgi', wsgi_base, wsgi_search), ('asgi', asgi_base, api_search)):
+                latencies, errors = asyncio.run(run_clients(base, cookie, search, routes, seconds, count))
+                report(label, count, seconds, latencies, errors)
+    finally:
+        for process in servers:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:2], connections=tuple(args[2:]) or (10, 100, 1000))
@@ -0,0 +1,149 @@
+"""Throughput of the app under gunicorn with 1, 4 and 16 worker processes.
+
+Seeds a throwaway database, then for each worker count starts gunicorn and
+drives it with client threads over real HTTP: mostly flight searches plus a
+share of full bookings (process_booking -> complete_booking), which take the
+database write lock.
+
+    pip install gunicorn
+    python benchmarks/load_workers.py [seconds] [clients] [workers ...]
+
+Point DATABASE_URL at a server database to compare it with SQLite.
+"""
+import http.cookiejar
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp()
+ENV = dict(
+    os.environ,
+    DATABASE_URL=os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'load.db')}"),
+    FLASK_SECRET_KEY='load-test',  # Shared by every worker so sessions survive worker hops
+    SESSION_COOKIE_SECURE='0',
+    LOGIN_IP_BURST='10000',  # Every client logs in from 127.0.0.1
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+os.environ.update(ENV)
+sys.path.insert(0, ROOT)
+
+from app import app, db, User, Flight, extend_schedule, generate_password_hash
+
+BOOKING_SHARE = 0.1
+PORT = 8765
+USERS = 64
+
+
+def seed():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        extend_schedule(datetime.now().date() + timedelta(days=1), 3)
+        for n in range(USERS):
+            db.session.add(User(username=f'load{n}', email=f'load{n}@example.com',
+                                password=generate_password_hash('load', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+        return [(f.id, f.departure, f.destination, f.departure_time.strftime('%Y-%m-%d'))
+                for f in Flight.query.filter(Flight.departure == 'DEL').limit(100)]
+
+
+class Client:
+    def __init__(self, base, username):
+        self.base = base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.post('/login', {'username': username, 'password': 'load'})
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode()
+        with self.opener.open(self.base + path, body, timeout=60) as response:
+            return response.read()
+
+    def search(self, flight):
+        _, departure, destination, travel_date = flight
+        self.post('/search-flights', {'departure': departure, 'destination': destination,
+                                      'travel_date': travel_date, 'passengers': 1})
+
+    def book(self, flight):
+        self.post('/process-booking', {'flight_id': flight[0], 'num_passengers': 1, 'first_name_1': 'Load',
+                                       'last_name_1': 'Test', 'age_1': 30, 'gender_1': 'M'})
+        self.post('/complete-booking', {})
+
+
+def run_clients(base, flights, seconds, clients):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+
+    def work(n):
+        rng = random.Random(n)
+        client = Client(base, f'load{n % USERS}')
+        while time.perf_counter() < deadline:
+            flight = rng.choice(flights)
+            started = time.perf_counter()
+            try:
+                client.book(flight) if rng.random() < BOOKING_SHARE else client.search(flight)
+                latencies.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError) as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def wait_until_up(base, process):
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def main(seconds=20, clients=32, workers=(1, 4, 16)):
+    gunicorn = shutil.which('gunicorn')
+    if not gunicorn:
+        sys.exit('gunicorn is required: pip install gunicorn')
+
+    print(f"database: {ENV['DATABASE_URL']}, {clients} clients, {seconds}s per run, "
+          f"{BOOKING_SHARE:.0%} bookings")
+    for count in workers:
+        flights = seed()
+        base = f'http://127.0.0.1:{PORT}'
+        process = subprocess.Popen([gunicorn, '-w', str(count), '-b', f'127.0.0.1:{PORT}', 'app:app'],
+                                   cwd=ROOT, env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(base, process)
+            latencies, errors = run_clients(base, flights, seconds, clients)
+        finally:
+            process.terminate()
+            process.wait()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+        print(f"{count:>3} workers: {len(latencies) / seconds:8.1f} req/s  "
+              f"p50 {statistics.median(latencies) * 1000 if latencies else float('nan'):7.1f} ms  "
+              f"p95 {p95:7.1f} ms  errors {len(errors)}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:2], workers=tuple(args[2:]) or (1, 4, 16))
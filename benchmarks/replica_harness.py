@@ -0,0 +1,106 @@
+"""Local read/write split harness: two SQLite files and a lagging "replication" thread.
+
+The primary is copied onto the replica with SQLite's backup API every LAG
+seconds, standing in for asynchronous replication. The script books a
+flight through the real routes, checks that the user sees their own ticket
+straight away (read-your-writes), and reports how many statements each
+engine served.
+
+    python benchmarks/replica_harness.py [searches]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+TMP = tempfile.mkdtemp()
+PRIMARY = os.path.join(TMP, 'primary.db')
+REPLICA = os.path.join(TMP, 'replica.db')
+os.environ.update(
+    DATABASE_URL=f'sqlite:///{PRIMARY}',
+    DATABASE_REPLICA_URL=f'sqlite:///{REPLICA}',
+    SESSION_COOKIE_SECURE='0',
+    TICKET_CACHE_DIR=os.path.join(TMP, 'tickets'),
+    PRELOAD_RENDERERS='0'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app, db, Flight, add_sample_data
+
+LAG = 2.0  # seconds between replication passes
+
+
+def replicate_forever(stop):
+    while not stop.wait(LAG):
+        replicate()
+
+
+def replicate():
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def count_statements(engine, counter, name):
+    @event.listens_for(engine, 'after_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter[name] += 1
+
+
+def main(searches=200):
+    with app.app_context():
+        db.create_all()
+        add_sample_data()
+        flight = Flight.query.filter(Flight.available_seats > 10).first()
+        flight_id, departure, destination = flight.id, flight.departure, flight.destination
+        travel_date = flight.departure_time.strftime('%Y-%m-%d')
+        statements = Counter()
+        count_statements(db.engines[None], statements, 'primary')
+        count_statements(db.engines['replica'], statements, 'replica')
+    replicate()
+
+    stop = threading.Event()
+    threading.Thread(target=replicate_forever, args=(stop,), daemon=True).start()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'testuser', 'password': 'test123'})
+    search = {'departure': departure, 'destination': destination, 'travel_date': travel_date, 'passengers': 1}
+
+    # Book, then read the ticket immediately: the replica can't have it yet
+    client.post('/process-booking', data={'flight_id': flight_id, 'num_passengers': 1, 'first_name_1': 'Read',
+                                          'last_name_1': 'Write', 'age_1': 30, 'gender_1': 'F'})
+    response = client.post('/complete-booking')
+    pnr = response.location.rsplit('/', 1)[-1]
+    statements.clear()
+    ticket = client.get(f'/ticket/{pnr}')
+    assert ticket.status_code == 200, 'read-your-writes failed: own ticket not visible'
+    assert statements['replica'] == 0, 'ticket read went to the replica right after booking'
+    print(f"booked {pnr}; ticket read from the primary immediately after")
+
+    # Once the pin expires and replication caught up, reads move to the replica
+    time.sleep(max(app.config['REPLICA_READ_YOUR_WRITES_SECONDS'], LAG) + LAG)
+    statements.clear()
+    started = time.perf_counter()
+    for _ in range(searches):
+        client.post('/search-flights', data=search)
+        client.get(f'/ticket/{pnr}')
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    total = sum(statements.values())
+    print(f"{2 * searches} reads in {elapsed:.2f}s: primary {statements['primary']} statements, "
+          f"replica {statements['replica']} statements ({statements['replica'] / max(total, 1):.0%})")
+    assert statements['replica'] > statements['primary'], 'reads were not routed to the replica'
+    print('OK')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
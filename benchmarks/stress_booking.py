@@ -0,0 +1,76 @@
+"""Concurrent booking stress test against a single flight.
+
+Fires many parallel single-passenger bookings at one flight through
+`create_booking` (the same path `complete_booking` uses) and checks that
+exactly `total_seats` passengers were sold.
+
+    python benchmarks/stress_booking.py [attempts] [threads]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'stress.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Flight, User, Booking, Passenger, create_booking
+
+TOTAL_SEATS = 180
+
+
+def setup():
+    with app.app_context():
+        db.create_all()
+        user = User(username='stress', email='stress@example.com', password='x')
+        dep_time = datetime.now() + timedelta(days=1)
+        flight = Flight(flight_number='AI101', airline='AirIndia', departure='DEL',
+                        destination='BOM', departure_time=dep_time,
+                        arrival_time=dep_time + timedelta(hours=2), price=5000,
+                        total_seats=TOTAL_SEATS, available_seats=TOTAL_SEATS)
+        db.session.add_all([user, flight])
+        db.session.commit()
+        return user.id, flight.id
+
+
+def book(user_id, flight_id, n):
+    booking_data = {
+        'flight_id': flight_id,
+        'num_passengers': 1,
+        'passengers': [{'first_name': 'Load', 'last_name': f'Test{n}', 'age': 30,
+                        'gender': 'M', 'passport': None}]
+    }
+    with app.app_context():
+        try:
+            return create_booking(user_id, booking_data) is not None
+        except Exception as e:
+            print(f"[ERROR] booking {n}: {e}")
+            return False
+
+
+def main(attempts=2000, threads=32):
+    user_id, flight_id = setup()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda n: book(user_id, flight_id, n), range(attempts)))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        flight = db.session.get(Flight, flight_id)
+        sold = db.session.query(Passenger).join(Booking).filter(Booking.flight_id == flight_id).count()
+        remaining = flight.available_seats
+
+    print(f"{attempts} attempts on {threads} threads in {elapsed:.2f}s "
+          f"({attempts / elapsed:.0f} attempts/s)")
+    print(f"succeeded={sum(results)} passengers_sold={sold} available_seats={remaining}")
+    assert sum(results) == TOTAL_SEATS, 'wrong number of successful bookings'
+    assert sold == TOTAL_SEATS, 'oversold or undersold passengers'
+    assert remaining == 0, 'inventory out of sync with passengers'
+    print('OK')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,34 @@
+"""Fare curves for the repricing job (flask reprice, see app.reprice_flights).
+
+A flight's fare is its base price scaled by two piecewise-linear curves:
+one over load factor (share of seats sold) and one over days to departure
+(PRICING_LOAD_CURVE and PRICING_DAYS_CURVE). Both are evaluated for a whole
+batch of flights at once with NumPy, so repricing the full timetable costs
+a few array operations per batch instead of Python arithmetic per row.
+"""
+import numpy as np
+
+
+def fare_multipliers(load_factor, days_out, load_curve, days_curve):
+    # Curves are [(x, multiplier), ...]; np.interp clamps outside them, so the end points extend flat
+    load_x, load_y = zip(*load_curve)
+    days_x, days_y = zip(*days_curve)
+    return np.interp(load_factor, load_x, load_y) * np.interp(days_out, days_x, days_y)
+
+
+def reprice_batch(rows, now, load_curve, days_curve):
+    """New fares for (id, base_price, price, available_seats, total_seats, departure_time) rows.
+
+    Returns [{'flight_id': ..., 'fare': ...}] for the flights whose fare changed.
+    """
+    ids, base_price, price, available_seats, total_seats, departure_time = zip(*rows)
+    base_price = np.array(base_price, dtype=np.float64)
+    total_seats = np.maximum(np.array(total_seats, dtype=np.float64), 1)
+    load_factor = 1 - np.array(available_seats, dtype=np.float64) / total_seats
+    days_out = np.maximum(
+        (np.array(departure_time, dtype='datetime64[us]') - np.datetime64(now, 'us')) / np.timedelta64(1, 'D'), 0)
+
+    fares = np.round(base_price * fare_multipliers(load_factor, days_out, load_curve, days_curve), 2)
+    changed = np.flatnonzero(np.abs(fares - np.array(price, dtype=np.float64)) >= 0.005)
+    ids = np.array(ids)
+    return [{'flight_id': int(flight_id), 'fare': float(fare)} for flight_id, fare in zip(ids[changed], fares[changed])]
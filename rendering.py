@@ -0,0 +1,90 @@
+"""Ticket PDF rendering shared by download_ticket, the background cache and bulk export.
+
+qrcode and xhtml2pdf take a long time to import, so they are loaded once per
+process (in a background thread at startup, see preload) rather than inside
+each request. Encoded QR codes are cached per PNR since they never change.
+"""
+import base64
+import threading
+import time
+from functools import lru_cache
+from io import BytesIO
+
+from flask import render_template
+
+QR_CACHE_SIZE = 4096
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+# 'cold' is the first render in this process, 'warm' every one after it
+render_timings = {
+    'import_seconds': None,
+    'cold': {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0},
+    'warm': {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+}
+_timings_lock = threading.Lock()
+
+
+def load_libraries():
+    with _libraries_lock:
+        if not _libraries:
+            start = time.perf_counter()
+            import qrcode
+            from xhtml2pdf import pisa
+            _libraries.update(qrcode=qrcode, pisa=pisa)
+            render_timings['import_seconds'] = time.perf_counter() - start
+    return _libraries
+
+
+def preload(background=True):
+    if background:
+        threading.Thread(target=load_libraries, name='render-preload', daemon=True).start()
+    else:
+        load_libraries()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_code_base64(pnr):
+    qr_img = load_libraries()['qrcode'].make(f"PNR:{pnr}")
+    qr_buffer = BytesIO()
+    qr_img.save(qr_buffer, format="PNG")
+    return base64.b64encode(qr_buffer.getvalue()).decode('utf-8')
+
+
+def _record(seconds):
+    with _timings_lock:
+        kind = 'warm' if render_timings['cold']['count'] else 'cold'
+        stats = render_timings[kind]
+        stats['count'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+
+def render_ticket_pdf(context):
+    """Render ticket_pdf.html for a ticket_context() dict and return the PDF bytes."""
+    start = time.perf_counter()
+    pisa = load_libraries()['pisa']
+    pnr = context['booking']['pnr']
+
+    rendered = render_template('ticket_pdf.html', qr_code=qr_code_base64(pnr), **context)
+    pdf = BytesIO()
+    pisa_status = pisa.CreatePDF(rendered, dest=pdf)
+    if pisa_status.err:
+        raise RuntimeError(f"PDF generation failed for {pnr}")
+
+    _record(time.perf_counter() - start)
+    return pdf.getvalue()
+
+
+def render_stats():
+    qr_cache = qr_code_base64.cache_info()
+    with _timings_lock:
+        stats = {
+            kind: dict(values, avg_ms=round(values['total_seconds'] / values['count'] * 1000, 2)
+                       if values['count'] else None)
+            for kind, values in render_timings.items() if kind != 'import_seconds'
+        }
+    stats['import_seconds'] = render_timings['import_seconds']
+    stats['qr_cache'] = {'hits': qr_cache.hits, 'misses': qr_cache.misses, 'size': qr_cache.currsize}
+    return stats